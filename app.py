@@ -2,19 +2,40 @@
 Aplicação Principal - Conversor XML para XLSX
 Escritório de Contabilidade - Versão Corrigida
 """
+import copy
+import functools
+import hashlib
+import re
+import uuid
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+from pathlib import Path
 import config
 from modules.upload_handler import UploadHandler
 from modules.xml_parser import XMLParser
 from modules.data_filter import DataFilter
 from modules.data_formatter import DataFormatter
 from modules.excel_exporter import ExcelExporter
+from modules.parquet_exporter import ParquetExporter
 from modules.dashboard_builder import DashboardBuilder
 from utils.logger import logger
 from utils.validators import validate_uploaded_files
 
+# Colunas de valor (convertidas para numérico ao final do processamento)
+_VALUE_COLUMN_RE = re.compile(r'valor|total|preco|custo', re.IGNORECASE)
+
+# Valores iniciais das variáveis de sessão
+_SESSION_DEFAULTS = {
+    'df_processed': None,
+    'df_token': None,
+    'visible_columns': (),
+    'xml_files': [],
+    'processing_complete': False,
+    'show_debug': False,
+    'selected_fields': list(config.DEFAULT_FIELD_NAMES)
+}
+
 # Configuração da página
 st.set_page_config(
     page_title="Conversor XML → XLSX",
@@ -51,14 +72,126 @@ st.markdown("""
 
 def initialize_session_state():
     """Inicializa variáveis de sessão"""
-    if 'df_processed' not in st.session_state:
-        st.session_state.df_processed = None
-    if 'xml_files' not in st.session_state:
-        st.session_state.xml_files = []
-    if 'processing_complete' not in st.session_state:
-        st.session_state.processing_complete = False
-    if 'show_debug' not in st.session_state:
-        st.session_state.show_debug = False
+    for key, value in _SESSION_DEFAULTS.items():
+        # Cópia para que listas não sejam compartilhadas entre sessões
+        st.session_state.setdefault(key, copy.copy(value))
+
+def compute_files_key(uploaded_files) -> str:
+    """
+    Calcula um hash estável do conteúdo dos arquivos enviados
+    
+    Args:
+        uploaded_files: Lista de arquivos do Streamlit uploader
+        
+    Returns:
+        Hash SHA-256 (hex) dos nomes e conteúdos
+    """
+    digest = hashlib.sha256()
+    for uploaded_file in uploaded_files:
+        digest.update(uploaded_file.name.encode('utf-8'))
+        digest.update(uploaded_file.getbuffer())
+    return digest.hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=8, ttl=3600)
+def parse_xmls_cached(files_key: str, skip_duplicates: bool, _xml_files) -> pd.DataFrame:
+    """
+    Converte os XMLs em DataFrame, reaproveitando o resultado entre reruns
+    
+    Args:
+        files_key: Hash do conteúdo enviado (chave do cache)
+        skip_duplicates: Se XMLs repetidos foram descartados (parte da chave)
+        _xml_files: Lista de tuplas (nome_arquivo, conteúdo_xml), fora do hash
+        
+    Returns:
+        DataFrame consolidado
+    """
+    parser = XMLParser()
+    return parser.parse_multiple_xmls(_xml_files)
+
+@functools.lru_cache(maxsize=32)
+def get_visible_columns(columns: tuple) -> tuple:
+    """
+    Retorna as colunas exibíveis (sem metadados com prefixo '_')
+    
+    Args:
+        columns: Tupla com os nomes das colunas do DataFrame
+        
+    Returns:
+        Tupla com as colunas visíveis
+    """
+    return tuple(col for col in columns if not col.startswith('_'))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def get_memory_usage_mb(df_token: str, _df: pd.DataFrame, columns: tuple) -> float:
+    """
+    Calcula o uso de memória das colunas informadas (em MB)
+    
+    Args:
+        df_token: Identificador único do processamento (chave do cache)
+        _df: DataFrame processado (mantido inalterado na sessão), fora do hash
+        columns: Colunas consideradas no cálculo
+        
+    Returns:
+        Tamanho em MB
+    """
+    return _df[list(columns)].memory_usage(deep=True).sum() / (1024**2)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_chart(df_token: str, _df: pd.DataFrame, columns: tuple, chart_name: str):
+    """
+    Gera (ou reaproveita) um gráfico do dashboard
+    
+    Args:
+        df_token: Identificador único do processamento (chave do cache)
+        _df: DataFrame processado (mantido inalterado na sessão), fora do hash
+        columns: Colunas exibidas no dashboard
+        chart_name: Nome do método do DashboardBuilder que cria o gráfico
+        
+    Returns:
+        Figura do Plotly ou None
+    """
+    create_chart = getattr(DashboardBuilder(), chart_name)
+    return create_chart(_df.loc[:, list(columns)])
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_excel_export(df_token: str, _df: pd.DataFrame, columns: tuple, include_summary: bool) -> bytes:
+    """
+    Gera (ou reaproveita) o arquivo Excel das colunas informadas
+    
+    Args:
+        df_token: Identificador único do processamento (chave do cache)
+        _df: DataFrame processado (mantido inalterado na sessão), fora do hash
+        columns: Colunas exportadas
+        include_summary: Se inclui a aba de resumo
+        
+    Returns:
+        Conteúdo do Excel ou None em caso de erro
+    """
+    exporter = ExcelExporter()
+    df_export = _df.loc[:, list(columns)]
+    
+    if include_summary:
+        excel_buffer = exporter.export_with_summary(df_export)
+    else:
+        excel_buffer = exporter.export_to_excel(df_export)
+    
+    return excel_buffer.getvalue() if excel_buffer else None
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_parquet_export(df_token: str, _df: pd.DataFrame, columns: tuple) -> bytes:
+    """
+    Gera (ou reaproveita) o arquivo Parquet das colunas informadas
+    
+    Args:
+        df_token: Identificador único do processamento (chave do cache)
+        _df: DataFrame processado (mantido inalterado na sessão), fora do hash
+        columns: Colunas exportadas
+        
+    Returns:
+        Conteúdo do Parquet ou None em caso de erro
+    """
+    parquet_buffer = ParquetExporter().export_to_parquet(_df[list(columns)])
+    return parquet_buffer.getvalue() if parquet_buffer else None
 
 def main():
     """Função principal da aplicação"""
@@ -130,8 +263,12 @@ def show_conversion_tab():
         st.info("👆 Faça upload dos arquivos XML para começar")
         return
     
-    # Valida arquivos
-    is_valid, errors = validate_uploaded_files(uploaded_files)
+    # Valida arquivos (reaproveita o resultado enquanto o upload não muda)
+    upload_key = tuple((f.name, f.size) for f in uploaded_files)
+    if st.session_state.get('validated_key') != upload_key:
+        st.session_state.validation_result = validate_uploaded_files(uploaded_files)
+        st.session_state.validated_key = upload_key
+    is_valid, errors = st.session_state.validation_result
     
     if not is_valid:
         for error in errors:
@@ -142,110 +279,90 @@ def show_conversion_tab():
     
     st.divider()
     
-    # Configurações com DROPDOWNS
-    col_settings, col_columns = st.columns([1, 2])
-    
-    with col_settings:
-        st.subheader("⚙️ Opções de Processamento")
-        
-        # Dropdown para remoção de duplicatas
-        remove_duplicates = st.selectbox(
-            "🗑️ Remover duplicatas?",
-            options=["Não", "Sim"],
-            index=0,
-            help="Remove registros idênticos do resultado"
-        )
-        remove_duplicates = (remove_duplicates == "Sim")
-        
-        # Dropdown para aba de resumo
-        include_summary = st.selectbox(
-            "📊 Incluir aba de resumo?",
-            options=["Sim", "Não"],
-            index=0,
-            help="Adiciona uma aba com estatísticas no Excel"
-        )
-        include_summary = (include_summary == "Sim")
-        
-        # Dropdown para formatação de datas
-        format_dates = st.selectbox(
-            "📅 Formatar datas?",
-            options=["Sim", "Não"],
-            index=0,
-            help="Converte datas para formato brasileiro"
-        )
-        format_dates = (format_dates == "Sim")
-        
-        # Dropdown para formatação de valores
-        format_currency = st.selectbox(
-            "💰 Formatar valores monetários?",
-            options=["Sim", "Não"],
-            index=0,
-            help="Formata valores como moeda brasileira"
-        )
-        format_currency = (format_currency == "Sim")
+    # Colunas disponíveis
+    available_fields = config.DEFAULT_FIELD_NAMES
     
-    with col_columns:
-        st.subheader("📋 Selecione as Colunas para Exportar")
-        st.caption("Marque apenas os campos que você precisa no Excel")
-        
-        # Colunas disponíveis
-        available_fields = list(config.DEFAULT_XML_FIELDS.keys())
+    # Formulário: as opções só disparam um rerun ao clicar em processar
+    with st.form("processing_form", border=False):
+        # Configurações com DROPDOWNS
+        col_settings, col_columns = st.columns([1, 2])
         
-        # Opção de selecionar/desselecionar tudo
-        col_all1, col_all2 = st.columns(2)
-        with col_all1:
-            select_all = st.button("✅ Selecionar Tudo", use_container_width=True)
-        with col_all2:
-            deselect_all = st.button("❌ Desmarcar Tudo", use_container_width=True)
-        
-        # Inicializa seleção no session_state
-        if 'selected_fields' not in st.session_state:
-            st.session_state.selected_fields = available_fields.copy()
+        with col_settings:
+            st.subheader("⚙️ Opções de Processamento")
+            
+            # Dropdown para remoção de duplicatas
+            remove_duplicates = st.selectbox(
+                "🗑️ Remover duplicatas?",
+                options=["Não", "Sim"],
+                index=0,
+                help="Remove registros idênticos do resultado"
+            )
+            remove_duplicates = (remove_duplicates == "Sim")
+            
+            # Dropdown para aba de resumo
+            include_summary = st.selectbox(
+                "📊 Incluir aba de resumo?",
+                options=["Sim", "Não"],
+                index=0,
+                help="Adiciona uma aba com estatísticas no Excel"
+            )
+            include_summary = (include_summary == "Sim")
+            
+            # Dropdown para formatação de datas
+            format_dates = st.selectbox(
+                "📅 Formatar datas?",
+                options=["Sim", "Não"],
+                index=0,
+                help="Converte datas para formato brasileiro"
+            )
+            format_dates = (format_dates == "Sim")
+            
+            # Dropdown para formatação de valores
+            format_currency = st.selectbox(
+                "💰 Formatar valores monetários?",
+                options=["Sim", "Não"],
+                index=0,
+                help="Formata valores como moeda brasileira"
+            )
+            format_currency = (format_currency == "Sim")
         
-        # Atualiza seleção baseado nos botões
-        if select_all:
-            st.session_state.selected_fields = available_fields.copy()
-        if deselect_all:
-            st.session_state.selected_fields = []
+        with col_columns:
+            st.subheader("📋 Selecione as Colunas para Exportar")
+            st.caption("Selecione apenas os campos que você precisa no Excel")
+            
+            # Um único widget de seleção (em vez de um checkbox por campo);
+            # o multiselect tem sua própria opção de limpar a seleção
+            selected_columns = st.multiselect(
+                "Selecione as colunas",
+                options=available_fields,
+                key="selected_fields",
+                label_visibility="collapsed"
+            )
         
-        # Organiza em 3 colunas
-        cols = st.columns(3)
-        selected_columns = []
+        st.divider()
         
-        for idx, field in enumerate(available_fields):
-            col_idx = idx % 3
-            with cols[col_idx]:
-                is_selected = field in st.session_state.selected_fields
-                if st.checkbox(field, value=is_selected, key=f"col_{field}"):
-                    selected_columns.append(field)
+        # Botão de processamento
+        col_btn1, col_btn2 = st.columns([3, 1])
         
-        # Atualiza session_state
-        st.session_state.selected_fields = selected_columns
+        with col_btn1:
+            submitted = st.form_submit_button("🚀 Processar Arquivos", type="primary",
+                                              use_container_width=True)
         
+        with col_btn2:
+            st.caption("👈 Configure e processe")
+    
+    if submitted:
         if not selected_columns:
             st.warning("⚠️ Selecione pelo menos uma coluna para continuar")
-    
-    st.divider()
-    
-    # Botão de processamento
-    col_btn1, col_btn2 = st.columns([3, 1])
-    
-    with col_btn1:
-        if selected_columns:
-            if st.button("🚀 Processar Arquivos", type="primary", use_container_width=True):
-                process_files(
-                    uploaded_files, 
-                    selected_columns, 
-                    remove_duplicates,
-                    format_dates, 
-                    format_currency, 
-                    include_summary
-                )
         else:
-            st.button("🚀 Processar Arquivos", disabled=True, use_container_width=True)
-    
-    with col_btn2:
-        st.caption("👈 Configure e processe")
+            process_files(
+                uploaded_files, 
+                selected_columns, 
+                remove_duplicates,
+                format_dates, 
+                format_currency, 
+                include_summary
+            )
     
     st.divider()
     
@@ -255,7 +372,7 @@ def show_conversion_tab():
         
         st.subheader("💾 Baixar Resultado")
         
-        col_file, col_down = st.columns([2, 1])
+        col_file, col_down, col_parquet = st.columns([2, 1, 1])
         
         with col_file:
             filename = st.text_input(
@@ -268,27 +385,38 @@ def show_conversion_tab():
             st.write("")
             st.write("")
             # Remove colunas de metadados
-            df_export = st.session_state.df_processed.copy()
-            df_export = df_export[[col for col in df_export.columns if not col.startswith('_')]]
+            df_processed = st.session_state.df_processed
+            visible_columns = st.session_state.visible_columns
             
-            # Gera Excel
-            exporter = ExcelExporter()
+            # Gera Excel (reaproveitado entre reruns)
             include_sum = st.session_state.get('include_summary', True)
+            excel_data = get_excel_export(st.session_state.df_token, df_processed,
+                                          visible_columns, include_sum)
             
-            if include_sum:
-                excel_buffer = exporter.export_with_summary(df_export)
-            else:
-                excel_buffer = exporter.export_to_excel(df_export, filename)
-            
-            if excel_buffer:
+            if excel_data:
                 st.download_button(
                     label="📥 Baixar Excel",
-                    data=excel_buffer,
+                    data=excel_data,
                     file_name=filename,
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     type="primary",
                     use_container_width=True
                 )
+        
+        with col_parquet:
+            st.write("")
+            st.write("")
+            # Parquet para uso em pipelines (Power BI, pandas, etc.)
+            parquet_data = get_parquet_export(st.session_state.df_token, df_processed, visible_columns)
+            
+            if parquet_data:
+                st.download_button(
+                    label="📥 Baixar Parquet",
+                    data=parquet_data,
+                    file_name=f"{Path(filename).stem}.parquet",
+                    mime="application/octet-stream",
+                    use_container_width=True
+                )
 
 def show_dashboard_tab():
     """Exibe a aba de dashboard"""
@@ -300,7 +428,8 @@ def show_dashboard_tab():
     df = st.session_state.df_processed
     
     # Filtra colunas de metadados
-    display_df = df[[col for col in df.columns if not col.startswith('_')]].copy()
+    visible_columns = st.session_state.visible_columns
+    display_df = df.loc[:, list(visible_columns)]
     
     st.header("📊 Dashboard de Análise")
     
@@ -320,21 +449,31 @@ def show_dashboard_tab():
     with col2:
         st.metric("Colunas", len(display_df.columns))
     with col3:
-        memory_mb = display_df.memory_usage(deep=True).sum() / (1024**2)
+        memory_mb = get_memory_usage_mb(st.session_state.df_token, df, visible_columns)
         st.metric("Tamanho", f"{memory_mb:.2f} MB")
     
-    # Controle de visualização
-    show_all = st.checkbox("Mostrar todas as linhas", value=False)
-    max_rows = len(display_df) if show_all else min(100, len(display_df))
+    # Paginação: apenas a página atual é enviada ao navegador
+    total_rows = len(display_df)
+    col_size, col_page = st.columns(2)
+    with col_size:
+        page_size = st.selectbox("Linhas por página", [50, 100, 500], index=1, key="preview_page_size")
+    
+    total_pages = max(1, -(-total_rows // page_size))
+    with col_page:
+        page = st.number_input("Página", min_value=1, max_value=total_pages, value=1,
+                               step=1, key="preview_page")
+    
+    start = (page - 1) * page_size
+    end = min(start + page_size, total_rows)
     
     st.dataframe(
-        display_df.head(max_rows),
+        display_df.iloc[start:end],
         use_container_width=True,
         height=400
     )
     
-    if not show_all and len(display_df) > 100:
-        st.caption(f"Mostrando 100 de {len(display_df)} linhas. Marque a opção acima para ver tudo.")
+    if total_pages > 1:
+        st.caption(f"Mostrando linhas {start + 1} a {end} de {total_rows} (página {page} de {total_pages}).")
     
     st.divider()
     
@@ -349,21 +488,21 @@ def show_dashboard_tab():
         ])
         
         with graph_tab1:
-            fig = dashboard.create_value_chart(display_df)
+            fig = get_chart(st.session_state.df_token, df, visible_columns, 'create_value_chart')
             if fig:
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("💡 Para ver este gráfico, inclua colunas de **Data** e **Valor** na conversão.")
         
         with graph_tab2:
-            fig = dashboard.create_top_emitters_chart(display_df)
+            fig = get_chart(st.session_state.df_token, df, visible_columns, 'create_top_emitters_chart')
             if fig:
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("💡 Para ver este gráfico, inclua a coluna **Nome Emitente** na conversão.")
         
         with graph_tab3:
-            fig = dashboard.create_distribution_chart(display_df)
+            fig = get_chart(st.session_state.df_token, df, visible_columns, 'create_distribution_chart')
             if fig:
                 st.plotly_chart(fig, use_container_width=True)
             else:
@@ -393,12 +532,18 @@ def process_files(uploaded_files, selected_columns, remove_duplicates,
                     st.error("❌ Nenhum arquivo XML válido encontrado!")
                     return
                 
+                # Ignora XMLs com conteúdo idêntico antes do parse
+                if remove_duplicates:
+                    xml_files, skipped = upload_handler.remove_duplicate_files(xml_files)
+                    if skipped > 0:
+                        st.info(f"🗑️ Ignorado(s) {skipped} arquivo(s) XML com conteúdo repetido")
+                
                 st.session_state.xml_files = xml_files
                 
-                # 2. Parse XML
+                # 2. Parse XML (com cache pelo conteúdo dos arquivos)
                 progress_bar.progress(30, text="🔄 Convertendo XMLs...")
-                parser = XMLParser()
-                df = parser.parse_multiple_xmls(xml_files)
+                files_key = compute_files_key(uploaded_files)
+                df = parse_xmls_cached(files_key, remove_duplicates, xml_files)
                 
                 if df.empty:
                     st.error("❌ Erro ao processar XMLs. Verifique o formato dos arquivos.")
@@ -409,19 +554,15 @@ def process_files(uploaded_files, selected_columns, remove_duplicates,
                         st.write("Tentando analisar o primeiro XML...")
                         
                         if xml_files:
+                            parser = XMLParser()
                             sample_fields = parser.get_available_fields(xml_files[0][1])
                             st.write("**Campos disponíveis no XML:**")
                             st.code("\n".join(sample_fields[:50]))
                     
                     return
                 
-                # 3. Substituir valores None por strings vazias ou zeros
-                progress_bar.progress(45, text="🧹 Limpando dados...")
-                for col in df.columns:
-                    df[col] = df[col].replace(['None', 'none', None], '')
-                
-                # 4. Filtrar colunas
-                progress_bar.progress(50, text="🔍 Filtrando colunas...")
+                # 3. Filtrar colunas
+                progress_bar.progress(45, text="🔍 Filtrando colunas...")
                 available_cols = [col for col in selected_columns if col in df.columns]
                 
                 if not available_cols:
@@ -437,12 +578,18 @@ def process_files(uploaded_files, selected_columns, remove_duplicates,
                 metadata_cols = [col for col in df.columns if col.startswith('_')]
                 df = df[available_cols + metadata_cols]
                 
+                # 4. Substituir valores None por strings vazias (só nas colunas mantidas)
+                progress_bar.progress(50, text="🧹 Limpando dados...")
+                df = df.replace(['None', 'none', None], '')
+                
                 # 5. Remover duplicatas
                 if remove_duplicates:
                     progress_bar.progress(60, text="🗑️ Removendo duplicatas...")
                     filter_handler = DataFilter()
                     original_len = len(df)
-                    df = filter_handler.remove_duplicates(df)
+                    # A chave de acesso identifica a nota; sem ela, compara a linha inteira
+                    key_columns = ['Chave NFe'] if 'Chave NFe' in df.columns else None
+                    df = filter_handler.remove_duplicates(df, subset=key_columns)
                     removed = original_len - len(df)
                     if removed > 0:
                         st.info(f"🗑️ Removidas {removed} linha(s) duplicada(s)")
@@ -452,8 +599,13 @@ def process_files(uploaded_files, selected_columns, remove_duplicates,
                 
                 formatter = DataFormatter()
                 
+                # Formata apenas o que foi pedido
+                if format_dates:
+                    df = formatter.format_dates(df)
+                if format_currency:
+                    df = formatter.format_currency(df)
                 if format_dates or format_currency:
-                    df = formatter.format_dataframe(df)
+                    df = formatter.format_text(df)
                 
                 # Preenche valores faltantes
                 df = formatter.fill_missing_values(df, strategy='empty')
@@ -462,15 +614,27 @@ def process_files(uploaded_files, selected_columns, remove_duplicates,
                 progress_bar.progress(90, text="✅ Finalizando...")
                 df = df.fillna('')
                 
-                # Garante que colunas de valor são numéricas
-                for col in df.columns:
-                    if any(keyword in col.lower() for keyword in ['valor', 'total', 'preco', 'custo']):
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+                # Garante que colunas de valor são numéricas (as já tipadas pelo
+                # parser como float64 não precisam de nova conversão)
+                value_cols = [col for col in df.columns
+                              if _VALUE_COLUMN_RE.search(col)
+                              and not pd.api.types.is_numeric_dtype(df[col])]
+                if value_cols:
+                    df[value_cols] = df[value_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
+                
+                # Armazena textos em memória Arrow (formato nativo do st.dataframe)
+                df = formatter.to_arrow_strings(df)
+                # Textos repetidos (emitentes, destinatários) viram category
+                df = formatter.optimize_dtypes(df)
                 
                 # 8. Finalizar
                 progress_bar.progress(100, text="✅ Concluído!")
                 
                 st.session_state.df_processed = df
+                # Identificador deste processamento: chave dos caches derivados do DataFrame
+                st.session_state.df_token = uuid.uuid4().hex
+                # Colunas visíveis calculadas uma vez por processamento
+                st.session_state.visible_columns = get_visible_columns(tuple(df.columns))
                 st.session_state.processing_complete = True
                 st.session_state.include_summary = include_summary
                 
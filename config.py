@@ -12,11 +12,22 @@ TEMP_DIR.mkdir(exist_ok=True)
 # Configurações de upload
 MAX_FILE_SIZE_MB = 200
 ALLOWED_EXTENSIONS = ['.xml', '.zip']
+# Threads para extração paralela de ZIPs (descompressão libera o GIL)
+MAX_EXTRACT_WORKERS = min(32, (os.cpu_count() or 4) * 2)
+
+# Configurações de parse
+# Lotes a partir deste tamanho são processados em paralelo (processos).
+# Cada lote cria um pool novo (spawn, ~0,5-1 s para subir os workers) e o
+# parse serial custa ~0,1-0,3 ms por nota: abaixo de alguns milhares de
+# arquivos o pool só adiciona latência.
+PARALLEL_PARSE_MIN_FILES = 5000
+MAX_PARSE_WORKERS = os.cpu_count() or 1
+PARSE_CHUNKSIZE = 16
 
 # Mapeamento de campos XML padrão para NFe (Nota Fiscal Eletrônica)
 # Caminhos expandidos para maior compatibilidade
 DEFAULT_XML_FIELDS = {
-    'Número da Nota': [
+    'Número da Nota': (
         'nfeProc.NFe.infNFe.ide.nNF',
         'NFe.infNFe.ide.nNF',
         'nfe.infNFe.ide.nNF',
@@ -24,8 +35,8 @@ DEFAULT_XML_FIELDS = {
         'ide.nNF',
         'nNF',
         'numero'
-    ],
-    'Data de Emissão': [
+    ),
+    'Data de Emissão': (
         'nfeProc.NFe.infNFe.ide.dhEmi',
         'NFe.infNFe.ide.dhEmi',
         'nfe.infNFe.ide.dhEmi',
@@ -35,8 +46,8 @@ DEFAULT_XML_FIELDS = {
         'dhEmi',
         'dEmi',
         'dataEmissao'
-    ],
-    'CNPJ Emitente': [
+    ),
+    'CNPJ Emitente': (
         'nfeProc.NFe.infNFe.emit.CNPJ',
         'NFe.infNFe.emit.CNPJ',
         'nfe.infNFe.emit.CNPJ',
@@ -44,8 +55,8 @@ DEFAULT_XML_FIELDS = {
         'emit.CNPJ',
         'emitente.CNPJ',
         'emitente.cnpj'
-    ],
-    'Nome Emitente': [
+    ),
+    'Nome Emitente': (
         'nfeProc.NFe.infNFe.emit.xNome',
         'NFe.infNFe.emit.xNome',
         'nfe.infNFe.emit.xNome',
@@ -53,8 +64,8 @@ DEFAULT_XML_FIELDS = {
         'emit.xNome',
         'emitente.xNome',
         'emitente.nome'
-    ],
-    'CNPJ Destinatário': [
+    ),
+    'CNPJ Destinatário': (
         'nfeProc.NFe.infNFe.dest.CNPJ',
         'NFe.infNFe.dest.CNPJ',
         'nfe.infNFe.dest.CNPJ',
@@ -62,8 +73,8 @@ DEFAULT_XML_FIELDS = {
         'dest.CNPJ',
         'destinatario.CNPJ',
         'destinatario.cnpj'
-    ],
-    'Nome Destinatário': [
+    ),
+    'Nome Destinatário': (
         'nfeProc.NFe.infNFe.dest.xNome',
         'NFe.infNFe.dest.xNome',
         'nfe.infNFe.dest.xNome',
@@ -71,8 +82,8 @@ DEFAULT_XML_FIELDS = {
         'dest.xNome',
         'destinatario.xNome',
         'destinatario.nome'
-    ],
-    'Valor Total': [
+    ),
+    'Valor Total': (
         'nfeProc.NFe.infNFe.total.ICMSTot.vNF',
         'NFe.infNFe.total.ICMSTot.vNF',
         'nfe.infNFe.total.ICMSTot.vNF',
@@ -82,8 +93,8 @@ DEFAULT_XML_FIELDS = {
         'vNF',
         'valorTotal',
         'valorNF'
-    ],
-    'Valor Produtos': [
+    ),
+    'Valor Produtos': (
         'nfeProc.NFe.infNFe.total.ICMSTot.vProd',
         'NFe.infNFe.total.ICMSTot.vProd',
         'nfe.infNFe.total.ICMSTot.vProd',
@@ -92,8 +103,8 @@ DEFAULT_XML_FIELDS = {
         'ICMSTot.vProd',
         'vProd',
         'valorProdutos'
-    ],
-    'Chave NFe': [
+    ),
+    'Chave NFe': (
         'nfeProc.protNFe.infProt.chNFe',
         'protNFe.infProt.chNFe',
         'nfeProc.NFe.infNFe.@Id',
@@ -102,7 +113,24 @@ DEFAULT_XML_FIELDS = {
         'infNFe.@Id',
         'chNFe',
         'chave'
-    ],
+    ),
+}
+
+# Nomes dos campos (materializados uma vez; usados a cada rerun da interface)
+DEFAULT_FIELD_NAMES = tuple(DEFAULT_XML_FIELDS.keys())
+
+# Tipos das colunas extraídas (aplicados ao montar o DataFrame)
+COLUMN_DTYPES = {
+    'Número da Nota': 'string[pyarrow]',
+    'Data de Emissão': 'datetime64[ns]',
+    'CNPJ Emitente': 'string[pyarrow]',
+    'Nome Emitente': 'string[pyarrow]',
+    'CNPJ Destinatário': 'string[pyarrow]',
+    'Nome Destinatário': 'string[pyarrow]',
+    'Valor Total': 'float64',
+    'Valor Produtos': 'float64',
+    'Chave NFe': 'string[pyarrow]',
+    '_arquivo_origem': 'string[pyarrow]',
 }
 
 # Configurações de formatação Excel
@@ -122,7 +150,8 @@ EXCEL_CONFIG = {
 DASHBOARD_CONFIG = {
     'chart_height': 400,
     'chart_template': 'plotly_white',
-    'currency_symbol': 'R$'
+    'currency_symbol': 'R$',
+    'max_chart_points': 2000  # Acima disso a série diária é agregada por semana/mês
 }
 
 # Mensagens do sistema
@@ -1,6 +1,8 @@
 """
 Módulo responsável pela construção do dashboard interativo
 """
+import functools
+import re
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -10,6 +12,33 @@ import config
 from utils.logger import logger
 from utils.helpers import format_currency
 
+# Palavras-chave de colunas monetárias e de data
+_MONETARY_RE = re.compile(r'valor|total|preco|preço|custo', re.IGNORECASE)
+_DATE_RE = re.compile(r'data', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=32)
+def _classify_columns(columns: tuple, dtypes: tuple) -> tuple:
+    """
+    Classifica as colunas em monetárias e de data (memoizado por colunas e tipos)
+    
+    Args:
+        columns: Tupla com os nomes das colunas
+        dtypes: Tupla com os tipos das colunas
+        
+    Returns:
+        Tupla (colunas monetárias, colunas de data)
+    """
+    monetary_columns = tuple(
+        col for col, dtype in zip(columns, dtypes)
+        if _MONETARY_RE.search(col) and pd.api.types.is_numeric_dtype(dtype)
+    )
+    date_columns = tuple(
+        col for col, dtype in zip(columns, dtypes)
+        if _DATE_RE.search(col) or pd.api.types.is_datetime64_any_dtype(dtype)
+    )
+    
+    return monetary_columns, date_columns
+
 class DashboardBuilder:
     """Constrói visualizações e métricas do dashboard"""
     
@@ -43,7 +72,8 @@ class DashboardBuilder:
         
         # Métrica 2: Valor total (primeira coluna monetária encontrada)
         if value_columns:
-            total_value = df[value_columns[0]].sum()
+            # Soma e média agregadas em uma única chamada
+            total_value, avg_value = df[value_columns[0]].agg(['sum', 'mean'])
             with cols[1]:
                 st.metric(
                     label=f"💰 {value_columns[0]}",
@@ -52,7 +82,6 @@ class DashboardBuilder:
         
         # Métrica 3: Valor médio
         if value_columns:
-            avg_value = df[value_columns[0]].mean()
             with cols[2]:
                 st.metric(
                     label="📈 Valor Médio",
@@ -61,10 +90,9 @@ class DashboardBuilder:
         
         # Métrica 4: Período (se houver data)
         if date_columns:
-            date_col = date_columns[0]
-            df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-            min_date = df[date_col].min()
-            max_date = df[date_col].max()
+            dates = self._ensure_datetime(df, date_columns[0])
+            min_date = dates.min()
+            max_date = dates.max()
             
             with cols[3]:
                 st.metric(
@@ -91,19 +119,26 @@ class DashboardBuilder:
             return None
         
         try:
-            # Prepara dados
-            plot_df = df.copy()
+            # Prepara dados (apenas as colunas usadas, sem copiar o DataFrame)
             date_col = date_columns[0]
             value_col = value_columns[0]
             
-            # Converte data
-            plot_df[date_col] = pd.to_datetime(plot_df[date_col], errors='coerce')
-            plot_df = plot_df.dropna(subset=[date_col])
+            dates = self._ensure_datetime(df, date_col)
+            valid = dates.notna()
             
             # Agrupa por data
-            daily_data = plot_df.groupby(plot_df[date_col].dt.date)[value_col].sum().reset_index()
+            daily_data = df.loc[valid, value_col].groupby(dates[valid].dt.date).sum().reset_index()
             daily_data.columns = ['Data', 'Valor']
             
+            # Muitos pontos diários: agrega por semana e depois por mês
+            max_points = self.config.get('max_chart_points', 2000)
+            for freq in ('W', 'MS'):
+                if len(daily_data) <= max_points:
+                    break
+                daily_data = (daily_data.set_index(pd.to_datetime(daily_data['Data']))['Valor']
+                              .resample(freq).sum(min_count=1).dropna().reset_index())
+                daily_data.columns = ['Data', 'Valor']
+            
             # Cria gráfico
             fig = px.line(
                 daily_data,
@@ -161,9 +196,9 @@ class DashboardBuilder:
                 template=self.config['chart_template']
             )
         else:
-            # Agrupa por emitente e soma valores
+            # Agrupa por emitente e soma valores (nlargest evita ordenar todos os grupos)
             value_col = value_columns[0]
-            top_emitters = df.groupby(emitter_col)[value_col].sum().sort_values(ascending=False).head(top_n)
+            top_emitters = df.groupby(emitter_col, observed=True)[value_col].sum().nlargest(top_n)
             
             fig = px.bar(
                 x=top_emitters.values,
@@ -233,7 +268,7 @@ class DashboardBuilder:
         st.caption(f"Exibindo {min(len(df), max_rows)} de {len(df)} registros")
         
         # Exibe tabela
-        display_df = df.head(max_rows)
+        display_df = df.iloc[:max_rows]
         st.dataframe(display_df, use_container_width=True, height=400)
     
     def create_summary_stats(self, df: pd.DataFrame) -> Dict[str, Any]:
@@ -255,32 +290,37 @@ class DashboardBuilder:
         # Estatísticas de valores
         value_columns = self._get_monetary_columns(df)
         if value_columns:
+            # Todas as agregações em uma única chamada (linhas: sum, mean, min, max)
+            aggregated = df[value_columns].agg(['sum', 'mean', 'min', 'max'])
             for col in value_columns:
-                stats[f'{col}_total'] = df[col].sum()
-                stats[f'{col}_mean'] = df[col].mean()
-                stats[f'{col}_min'] = df[col].min()
-                stats[f'{col}_max'] = df[col].max()
+                stats[f'{col}_total'] = aggregated.at['sum', col]
+                stats[f'{col}_mean'] = aggregated.at['mean', col]
+                stats[f'{col}_min'] = aggregated.at['min', col]
+                stats[f'{col}_max'] = aggregated.at['max', col]
         
         return stats
     
-    def _get_monetary_columns(self, df: pd.DataFrame) -> list:
-        """Retorna lista de colunas monetárias"""
-        monetary_keywords = ['valor', 'total', 'preco', 'preço', 'custo']
-        columns = []
+    def _ensure_datetime(self, df: pd.DataFrame, column: str) -> pd.Series:
+        """
+        Retorna a coluna como datetime, convertendo apenas se necessário
         
-        for col in df.columns:
-            if any(keyword in col.lower() for keyword in monetary_keywords):
-                if pd.api.types.is_numeric_dtype(df[col]):
-                    columns.append(col)
+        O DataFrame não é alterado (ele é compartilhado com o cache da aplicação).
         
-        return columns
+        Args:
+            df: DataFrame com os dados
+            column: Nome da coluna de data
+            
+        Returns:
+            Serie datetime (valores inválidos viram NaT)
+        """
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            return df[column]
+        return pd.to_datetime(df[column], errors='coerce')
+    
+    def _get_monetary_columns(self, df: pd.DataFrame) -> list:
+        """Retorna lista de colunas monetárias"""
+        return list(_classify_columns(tuple(df.columns), tuple(df.dtypes))[0])
     
     def _get_date_columns(self, df: pd.DataFrame) -> list:
         """Retorna lista de colunas de data"""
-        date_columns = []
-        
-        for col in df.columns:
-            if 'data' in col.lower() or pd.api.types.is_datetime64_any_dtype(df[col]):
-                date_columns.append(col)
-        
-        return date_columns
\ No newline at end of file
+        return list(_classify_columns(tuple(df.columns), tuple(df.dtypes))[1])
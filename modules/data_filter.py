@@ -33,7 +33,8 @@ class DataFilter:
             logger.warning("Nenhuma coluna selecionada encontrada no DataFrame")
             return df
         
-        return df[available_columns].copy()
+        # A seleção por lista já devolve um novo DataFrame (dispensa .copy())
+        return df[available_columns]
     
     def filter_by_date_range(self, df: pd.DataFrame, 
                             date_column: str,
@@ -55,20 +56,30 @@ class DataFilter:
             logger.warning(f"Coluna '{date_column}' não encontrada")
             return df
         
-        filtered_df = df.copy()
+        # Sem limites não há o que filtrar
+        if not start_date and not end_date:
+            return df
         
         try:
-            # Converte coluna para datetime se necessário
-            if not pd.api.types.is_datetime64_any_dtype(filtered_df[date_column]):
-                filtered_df[date_column] = pd.to_datetime(filtered_df[date_column], errors='coerce')
-            
-            # Aplica filtro de data inicial
-            if start_date:
-                filtered_df = filtered_df[filtered_df[date_column] >= pd.to_datetime(start_date)]
-            
-            # Aplica filtro de data final
-            if end_date:
-                filtered_df = filtered_df[filtered_df[date_column] <= pd.to_datetime(end_date)]
+            # Converte a coluna localmente, sem alterar o DataFrame
+            dates = df[date_column]
+            if not pd.api.types.is_datetime64_any_dtype(dates):
+                dates = pd.to_datetime(dates, errors='coerce')
+            
+            if dates.is_monotonic_increasing:
+                # Datas ordenadas: os limites viram posições (busca binária)
+                start = dates.searchsorted(pd.Timestamp(start_date), side='left') if start_date else 0
+                end = dates.searchsorted(pd.Timestamp(end_date), side='right') if end_date else len(dates)
+                filtered_df = df.iloc[start:end]
+            else:
+                # Aplica os limites em uma única máscara vetorizada
+                if start_date and end_date:
+                    mask = dates.between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+                elif start_date:
+                    mask = dates >= pd.Timestamp(start_date)
+                else:
+                    mask = dates <= pd.Timestamp(end_date)
+                filtered_df = df.loc[mask]
             
             logger.info(f"Filtro de data aplicado: {len(filtered_df)} registros mantidos")
             return filtered_df
@@ -97,20 +108,26 @@ class DataFilter:
             logger.warning(f"Coluna '{value_column}' não encontrada")
             return df
         
-        filtered_df = df.copy()
+        filtered_df = df
         
         try:
-            # Converte para numérico se necessário
-            if not pd.api.types.is_numeric_dtype(filtered_df[value_column]):
-                filtered_df[value_column] = pd.to_numeric(filtered_df[value_column], errors='coerce')
-            
-            # Aplica filtro mínimo
-            if min_value is not None:
-                filtered_df = filtered_df[filtered_df[value_column] >= min_value]
+            # Converte a coluna localmente, sem alterar o DataFrame
+            values = df[value_column]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors='coerce')
+            
+            # Aplica os limites em uma única máscara vetorizada
+            if min_value is not None and max_value is not None:
+                mask = values.between(min_value, max_value)
+            elif min_value is not None:
+                mask = values >= min_value
+            elif max_value is not None:
+                mask = values <= max_value
+            else:
+                mask = None
             
-            # Aplica filtro máximo
-            if max_value is not None:
-                filtered_df = filtered_df[filtered_df[value_column] <= max_value]
+            if mask is not None:
+                filtered_df = filtered_df.loc[mask]
             
             logger.info(f"Filtro de valor aplicado: {len(filtered_df)} registros mantidos")
             return filtered_df
@@ -139,15 +156,16 @@ class DataFilter:
             return df
         
         try:
-            filtered_df = df.copy()
-            filtered_df[column] = filtered_df[column].astype(str)
+            # Colunas de texto são buscadas diretamente; as demais são convertidas localmente
+            text = df[column]
+            if not (isinstance(text.dtype, pd.StringDtype)
+                    or pd.api.types.infer_dtype(text, skipna=True) == 'string'):
+                text = text.astype(str)
             
-            if case_sensitive:
-                mask = filtered_df[column].str.contains(search_text, na=False)
-            else:
-                mask = filtered_df[column].str.contains(search_text, case=False, na=False)
+            # Busca literal (o texto digitado não é interpretado como regex)
+            mask = text.str.contains(search_text, case=case_sensitive, na=False, regex=False)
             
-            return filtered_df[mask]
+            return df.loc[mask]
         
         except Exception as e:
             logger.error(f"Erro ao filtrar por texto: {e}")
@@ -158,6 +176,9 @@ class DataFilter:
         """
         Remove linhas duplicadas
         
+        Com subset, linhas com todas as colunas-chave vazias nunca são
+        consideradas duplicadas entre si (chave ausente não identifica o registro).
+        
         Args:
             df: DataFrame
             subset: Lista de colunas para considerar na duplicação
@@ -167,7 +188,13 @@ class DataFilter:
         """
         try:
             original_count = len(df)
-            deduplicated_df = df.drop_duplicates(subset=subset, keep='first')
+            
+            if subset:
+                # Compara apenas as colunas-chave (hash de poucas colunas)
+                empty_key = (df[subset].fillna('').astype(str) == '').all(axis=1)
+                deduplicated_df = df.loc[empty_key | ~df.duplicated(subset=subset, keep='first')]
+            else:
+                deduplicated_df = df.drop_duplicates(keep='first')
             removed_count = original_count - len(deduplicated_df)
             
             if removed_count > 0:
@@ -3,9 +3,26 @@ Módulo responsável pela formatação e limpeza de dados
 """
 import pandas as pd
 import re
+import unicodedata
 from typing import List
 from utils.logger import logger
-from utils.helpers import safe_float, safe_string
+from utils.helpers import safe_string
+
+# Padrões de CPF/CNPJ; como texto (e não re.compile), o pyarrow aplica as
+# expressões direto na coluna sem voltar ao Python
+_NON_DIGIT_PATTERN = r'[^0-9]'
+_CNPJ_PATTERN = (r'^(\d{2})(\d{3})(\d{3})(\d{4})(\d{2})$', r'\1.\2.\3/\4-\5')
+_CPF_PATTERN = (r'^(\d{3})(\d{3})(\d{3})(\d{2})$', r'\1.\2.\3-\4')
+# Sequências de espaços (inclui separadores Unicode, como o espaço não separável)
+_WHITESPACE_PATTERN = r'[\s\pZ]+'
+
+# Padronização de nomes de colunas (o NFKD separa os acentos, que são
+# removidos junto com os demais caracteres especiais)
+_SPECIAL_CHARS_RE = re.compile(r'[^\w\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+# Palavras-chave de colunas monetárias
+_MONETARY_RE = re.compile(r'valor|total|preco|preço|custo|desconto', re.IGNORECASE)
 
 class DataFormatter:
     """Formata e limpa dados do DataFrame"""
@@ -20,6 +37,55 @@ class DataFormatter:
         Args:
             df: DataFrame a formatar
             
+        Returns:
+            DataFrame formatado
+        """
+        return self._apply_formats(df, {'monetary', 'document', 'date', 'text'})
+    
+    def format_dates(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converte apenas as colunas de data para datetime
+        
+        Args:
+            df: DataFrame a formatar
+            
+        Returns:
+            DataFrame com datas convertidas
+        """
+        return self._apply_formats(df, {'date'})
+    
+    def format_currency(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converte apenas as colunas monetárias para float
+        
+        Args:
+            df: DataFrame a formatar
+            
+        Returns:
+            DataFrame com valores convertidos
+        """
+        return self._apply_formats(df, {'monetary'})
+    
+    def format_text(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Formata documentos (CPF/CNPJ) e limpa colunas de texto
+        
+        Args:
+            df: DataFrame a formatar
+            
+        Returns:
+            DataFrame com textos formatados
+        """
+        return self._apply_formats(df, {'document', 'text'})
+    
+    def _apply_formats(self, df: pd.DataFrame, kinds: set) -> pd.DataFrame:
+        """
+        Formata somente as colunas cujo tipo está em kinds
+        
+        Args:
+            df: DataFrame a formatar
+            kinds: Tipos de coluna a formatar ('monetary', 'document', 'date', 'text')
+            
         Returns:
             DataFrame formatado
         """
@@ -28,24 +94,22 @@ class DataFormatter:
         
         formatted_df = df.copy()
         
+        # Função de formatação por tipo de coluna
+        handlers = {
+            'monetary': self._format_monetary_values,
+            'document': self._format_documents,
+            'date': self._parse_dates,
+            'text': self._clean_strings
+        }
+        
         # Formata cada coluna baseado em seu tipo/nome
         for column in formatted_df.columns:
+            kind = self._column_kind(column, formatted_df[column])
+            if kind not in kinds:
+                continue
+            
             try:
-                # Formata valores monetários
-                if self._is_monetary_column(column):
-                    formatted_df[column] = self._format_monetary_values(formatted_df[column])
-                
-                # Formata CPF/CNPJ
-                elif 'cnpj' in column.lower() or 'cpf' in column.lower():
-                    formatted_df[column] = formatted_df[column].apply(self._format_document)
-                
-                # Formata datas
-                elif 'data' in column.lower() or pd.api.types.is_datetime64_any_dtype(formatted_df[column]):
-                    formatted_df[column] = pd.to_datetime(formatted_df[column], errors='coerce')
-                
-                # Limpa strings
-                elif formatted_df[column].dtype == 'object':
-                    formatted_df[column] = formatted_df[column].apply(self._clean_string)
+                formatted_df[column] = handlers[kind](formatted_df[column])
             
             except Exception as e:
                 logger.warning(f"Erro ao formatar coluna {column}: {e}")
@@ -53,10 +117,32 @@ class DataFormatter:
         
         return formatted_df
     
+    def _column_kind(self, column: str, series: pd.Series) -> str:
+        """
+        Identifica o tipo de formatação aplicável à coluna
+        
+        Args:
+            column: Nome da coluna
+            series: Dados da coluna
+            
+        Returns:
+            'monetary', 'document', 'date', 'text' ou None
+        """
+        if self._is_monetary_column(column):
+            return 'monetary'
+        
+        name = column.lower()
+        if 'cnpj' in name or 'cpf' in name:
+            return 'document'
+        if 'data' in name or pd.api.types.is_datetime64_any_dtype(series):
+            return 'date'
+        if series.dtype == 'object' or isinstance(series.dtype, pd.StringDtype):
+            return 'text'
+        return None
+    
     def _is_monetary_column(self, column_name: str) -> bool:
         """Verifica se coluna contém valores monetários"""
-        monetary_keywords = ['valor', 'total', 'preco', 'preço', 'custo', 'desconto']
-        return any(keyword in column_name.lower() for keyword in monetary_keywords)
+        return bool(_MONETARY_RE.search(column_name))
     
     def _format_monetary_values(self, series: pd.Series) -> pd.Series:
         """
@@ -68,56 +154,70 @@ class DataFormatter:
         Returns:
             Serie formatada
         """
-        def convert_value(val):
-            # Trata None e strings "None"
-            if pd.isna(val) or val is None or str(val).strip() in ["None", ""]:
-                return 0.0
-            return safe_float(val, 0.0)
+        # Colunas já numéricas (tipadas pelo parser) só precisam dos nulos zerados
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            return series.astype('float64').fillna(0.0)
+        
+        # Texto: "1.234,56" (formato brasileiro) vira "1234.56"; "1234.56" (XML) fica igual
+        text = series.astype('string[pyarrow]').str.strip()
+        brazilian = text.str.contains(',', regex=False).fillna(False)
+        text = text.mask(brazilian, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
         
-        return series.apply(convert_value)
+        # Valores vazios, "None" ou inválidos viram 0.0
+        return pd.to_numeric(text, errors='coerce').astype('float64').fillna(0.0)
     
-    def _format_document(self, doc: str) -> str:
+    def _parse_dates(self, series: pd.Series) -> pd.Series:
         """
-        Formata CPF ou CNPJ
+        Converte datas no formato ISO 8601 das NFe (ex: 2025-01-01T10:00:00-03:00)
+        
+        Com o formato explícito o pandas usa o parser ISO vetorizado, sem
+        inferir o formato a partir dos valores.
         
         Args:
-            doc: Documento sem formatação
+            series: Serie com datas em texto
             
         Returns:
-            Documento formatado
+            Serie convertida (valores inválidos viram NaT)
         """
-        if pd.isna(doc) or doc is None or str(doc).strip() in ["None", ""]:
-            return ""
-        
-        # Remove tudo que não é número
-        doc = re.sub(r'\D', '', str(doc))
-        
-        # Formata CNPJ (14 dígitos)
-        if len(doc) == 14:
-            return f"{doc[:2]}.{doc[2:5]}.{doc[5:8]}/{doc[8:12]}-{doc[12:]}"
+        # Colunas já tipadas pelo parser não precisam de nova conversão
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        return pd.to_datetime(series, format='ISO8601', errors='coerce')
+    
+    def _format_documents(self, series: pd.Series) -> pd.Series:
+        """
+        Formata CPF ou CNPJ de uma coluna inteira (operações vetorizadas)
         
-        # Formata CPF (11 dígitos)
-        elif len(doc) == 11:
-            return f"{doc[:3]}.{doc[3:6]}.{doc[6:9]}-{doc[9:]}"
+        Args:
+            series: Serie com documentos sem formatação
+            
+        Returns:
+            Serie com documentos formatados (vazios/None viram "")
+        """
+        # Remove tudo que não é número ("None" e nulos viram "")
+        digits = series.astype('string[pyarrow]').str.replace(_NON_DIGIT_PATTERN, '', regex=True).fillna('')
         
-        return doc
+        # CNPJ (14 dígitos) e CPF (11 dígitos); demais tamanhos ficam só com os números
+        formatted = digits.str.replace(*_CNPJ_PATTERN, regex=True)
+        formatted = formatted.str.replace(*_CPF_PATTERN, regex=True)
+        return formatted.astype(object)
     
-    def _clean_string(self, text) -> str:
+    def _clean_strings(self, series: pd.Series) -> pd.Series:
         """
-        Remove espaços extras e caracteres especiais de strings
+        Remove espaços extras de uma coluna de texto (operações vetorizadas)
         
         Args:
-            text: Texto a limpar
+            series: Serie com textos a limpar
             
         Returns:
-            Texto limpo
+            Serie com textos limpos (nulos e "None" viram "")
         """
-        if pd.isna(text) or text is None or str(text).strip() == "None":
-            return ""
+        text = series.astype('string[pyarrow]').str.strip().fillna('')
+        text = text.mask(text == 'None', '')
         
-        text = str(text).strip()
-        text = re.sub(r'\s+', ' ', text)  # Remove espaços múltiplos
-        return text
+        # Remove espaços múltiplos
+        cleaned = text.str.replace(_WHITESPACE_PATTERN, ' ', regex=True)
+        return cleaned.astype(object)
     
     def fill_missing_values(self, df: pd.DataFrame, strategy: str = 'empty') -> pd.DataFrame:
         """
@@ -133,16 +233,24 @@ class DataFormatter:
         filled_df = df.copy()
         
         try:
-            # Primeiro, substitui string "None" por NaN
-            filled_df = filled_df.replace(['None', 'none', 'NONE'], pd.NA)
+            # Primeiro, substitui string "None" por NaN (só colunas de texto podem conter)
+            text_columns = [
+                column for column in filled_df.columns
+                if filled_df[column].dtype == 'object' or isinstance(filled_df[column].dtype, pd.StringDtype)
+            ]
+            if text_columns:
+                filled_df = filled_df.assign(**{
+                    column: filled_df[column].mask(filled_df[column].isin(['None', 'none', 'NONE']), pd.NA)
+                    for column in text_columns
+                })
             
             if strategy == 'empty':
-                # Preenche com strings vazias para texto, 0 para números
-                for column in filled_df.columns:
-                    if pd.api.types.is_numeric_dtype(filled_df[column]):
-                        filled_df[column] = filled_df[column].fillna(0)
-                    else:
-                        filled_df[column] = filled_df[column].fillna('')
+                # Preenche com strings vazias para texto, 0 para números (uma única chamada)
+                fill_values = {
+                    column: 0 if pd.api.types.is_numeric_dtype(filled_df[column]) else ''
+                    for column in filled_df.columns
+                }
+                filled_df = filled_df.fillna(fill_values)
             
             elif strategy == 'zero':
                 filled_df = filled_df.fillna(0)
@@ -155,7 +263,7 @@ class DataFormatter:
                 )
             
             elif strategy == 'forward':
-                filled_df = filled_df.fillna(method='ffill')
+                filled_df = filled_df.ffill()
             
             return filled_df
         
@@ -163,6 +271,68 @@ class DataFormatter:
             logger.error(f"Erro ao preencher valores faltantes: {e}")
             return df
     
+    def to_arrow_strings(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converte colunas de texto para strings em memória Arrow (pyarrow)
+        
+        Apenas colunas object contendo exclusivamente strings são convertidas;
+        colunas mistas (ex: datas com células vazias) permanecem inalteradas.
+        
+        Args:
+            df: DataFrame
+            
+        Returns:
+            DataFrame com colunas de texto no formato Arrow
+        """
+        try:
+            text_columns = [
+                column for column in df.columns
+                if df[column].dtype == 'object'
+                and pd.api.types.infer_dtype(df[column], skipna=True) == 'string'
+            ]
+            
+            if not text_columns:
+                return df
+            
+            return df.astype({column: 'string[pyarrow]' for column in text_columns})
+        
+        except Exception as e:
+            logger.error(f"Erro ao converter colunas para Arrow: {e}")
+            return df
+    
+    def optimize_dtypes(self, df: pd.DataFrame, max_unique_ratio: float = 0.5) -> pd.DataFrame:
+        """
+        Converte colunas de texto com poucos valores distintos para category
+        
+        Colunas numéricas permanecem float64: valores monetários não podem
+        perder precisão com float32.
+        
+        Args:
+            df: DataFrame
+            max_unique_ratio: Proporção máxima de valores distintos por linha
+            
+        Returns:
+            DataFrame com tipos otimizados
+        """
+        if df.empty:
+            return df
+        
+        try:
+            category_columns = [
+                column for column in df.columns
+                if isinstance(df[column].dtype, pd.StringDtype)
+                and df[column].nunique(dropna=True) / len(df) < max_unique_ratio
+            ]
+            
+            if not category_columns:
+                return df
+            
+            return df.astype({column: 'category' for column in category_columns})
+        
+        except Exception as e:
+            logger.error(f"Erro ao otimizar tipos das colunas: {e}")
+            return df
+    
     def rename_columns(self, df: pd.DataFrame, mapping: dict = None) -> pd.DataFrame:
         """
         Renomeia colunas do DataFrame
@@ -196,10 +366,10 @@ class DataFormatter:
         try:
             new_columns = []
             for col in df.columns:
-                # Remove acentos e caracteres especiais
-                new_col = col.strip()
-                new_col = re.sub(r'[^\w\s]', '', new_col)
-                new_col = re.sub(r'\s+', '_', new_col)
+                # Remove acentos (ex: "Emissão" -> "Emissao") e caracteres especiais
+                new_col = unicodedata.normalize('NFKD', col.strip())
+                new_col = _SPECIAL_CHARS_RE.sub('', new_col)
+                new_col = _SPACES_RE.sub('_', new_col)
                 new_columns.append(new_col)
             
             df.columns = new_columns
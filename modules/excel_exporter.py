@@ -1,228 +1,314 @@
 """
 Módulo responsável pela exportação de dados para Excel
 """
+import re
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+import xlsxwriter
 from io import BytesIO
 from datetime import datetime
 import config
 from utils.logger import logger
+from utils.helpers import format_currency
+
+# Palavras-chave de colunas monetárias
+_MONETARY_RE = re.compile(r'valor|total|preco|preço|custo|desconto', re.IGNORECASE)
 
 class ExcelExporter:
     """Exporta DataFrames para arquivos Excel formatados"""
-    
+
     def __init__(self):
         self.config = config.EXCEL_CONFIG
-    
+        # constant_memory grava cada linha em disco assim que é escrita
+        self.workbook_options = {
+            'constant_memory': True,
+            'tmpdir': str(config.TEMP_DIR),
+            'remove_timezone': True,
+            'nan_inf_to_errors': True
+        }
+
     def export_to_excel(self, df: pd.DataFrame, filename: str = None) -> BytesIO:
         """
         Exporta DataFrame para Excel formatado
-        
+
         Args:
             df: DataFrame a exportar
             filename: Nome do arquivo (opcional)
-            
+
         Returns:
             BytesIO com o conteúdo do Excel
         """
         if df.empty:
             logger.warning("DataFrame vazio, nada para exportar")
             return None
-        
+
         # Cria buffer em memória
         output = BytesIO()
-        
+
         try:
             # Remove valores None antes de exportar
-            df_clean = df.copy()
-            df_clean = df_clean.fillna('')
-            
-            # Exporta para Excel
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_clean.to_excel(writer, index=False, sheet_name='Dados')
-                
-                # Acessa o workbook para aplicar formatações
-                workbook = writer.book
-                worksheet = writer.sheets['Dados']
-                
-                # Aplica formatações
-                self._format_header(worksheet)
-                self._format_columns(worksheet, df_clean)
-                self._adjust_column_widths(worksheet, df_clean)
-                self._apply_borders(worksheet, len(df_clean))
-            
+            df_clean = self._fill_missing(df)
+
+            # Exporta para Excel (linha a linha, sem manter a planilha em memória).
+            # O with garante o close(), que apaga os temporários de TEMP_DIR
+            # mesmo se a escrita falhar
+            with xlsxwriter.Workbook(output, self.workbook_options) as workbook:
+                self._write_sheet(workbook, 'Dados', df_clean, format_columns=True, borders=True)
+
             output.seek(0)
             logger.info(f"Excel exportado com sucesso: {len(df)} linhas")
             return output
-        
+
         except Exception as e:
             logger.error(f"Erro ao exportar Excel: {e}")
             return None
-    
-    def _format_header(self, worksheet):
+
+    def _write_sheet(self, workbook, sheet_name: str, df: pd.DataFrame,
+                     format_columns: bool = False, borders: bool = False):
         """
-        Formata o cabeçalho da planilha
-        
+        Escreve um DataFrame em uma nova aba, com formatos definidos por coluna
+
         Args:
-            worksheet: Worksheet do openpyxl
-        """
-        header_font = Font(bold=True, color='FFFFFF', size=11)
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Aplica formatação na primeira linha (cabeçalho)
-        for cell in worksheet[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-    
-    def _format_columns(self, worksheet, df: pd.DataFrame):
-        """
-        Formata colunas baseado em seu tipo de dado
-        
+            workbook: Workbook do xlsxwriter
+            sheet_name: Nome da aba
+            df: DataFrame sem valores nulos
+            format_columns: Se aplica formatos por tipo de coluna
+            borders: Se aplica bordas nas células
+        """
+        worksheet = workbook.add_worksheet(sheet_name)
+
+        # Formatos e larguras precisam ser definidos antes das linhas
+        if format_columns:
+            column_formats = self._format_columns(workbook, df, borders)
+            df = self._prepare_values(df)
+        else:
+            column_formats = [None] * len(df.columns)
+
+        # fillna('') não alcança colunas datetime64: NaT vira célula vazia
+        df = self._blank_missing_dates(df)
+
+        widths = self._adjust_column_widths(df)
+        for idx, (width, column_format) in enumerate(zip(widths, column_formats)):
+            worksheet.set_column(idx, idx, width, column_format)
+
+        # Cabeçalho
+        worksheet.write_row(0, 0, list(df.columns), self._format_header(workbook, borders))
+
+        # Dados: as células herdam o formato definido para a coluna
+        for row_idx, row in enumerate(df.itertuples(index=False, name=None), 1):
+            worksheet.write_row(row_idx, 0, row)
+
+    def _format_header(self, workbook, borders: bool = False):
+        """
+        Cria o formato do cabeçalho da planilha
+
         Args:
-            worksheet: Worksheet do openpyxl
-            df: DataFrame original
+            workbook: Workbook do xlsxwriter
+            borders: Se inclui bordas
+
+        Returns:
+            Formato do xlsxwriter
+        """
+        return workbook.add_format({
+            'bold': True,
+            'font_color': '#FFFFFF',
+            'font_size': 11,
+            'bg_color': '#4472C4',
+            'align': 'center',
+            'valign': 'vcenter',
+            'border': 1 if borders else 0
+        })
+
+    def _format_columns(self, workbook, df: pd.DataFrame, borders: bool = False) -> list:
         """
-        for idx, column in enumerate(df.columns, 1):
-            column_letter = get_column_letter(idx)
-            
-            # Formata colunas monetárias
-            if self._is_monetary_column(column):
-                for row in range(2, len(df) + 2):
-                    cell = worksheet[f'{column_letter}{row}']
-                    # Garante que é número antes de formatar
-                    try:
-                        if cell.value and cell.value != '':
-                            cell.value = float(cell.value)
-                            cell.number_format = 'R$ #,##0.00'
-                    except:
-                        cell.value = 0.0
-                        cell.number_format = 'R$ #,##0.00'
-                    cell.alignment = Alignment(horizontal='right')
-            
-            # Formata colunas de data
-            elif 'data' in column.lower() or pd.api.types.is_datetime64_any_dtype(df[column]):
-                for row in range(2, len(df) + 2):
-                    cell = worksheet[f'{column_letter}{row}']
-                    if cell.value and cell.value != '':
-                        cell.number_format = 'DD/MM/YYYY HH:MM'
-                    cell.alignment = Alignment(horizontal='center')
-            
-            # Centraliza colunas de documento (CPF/CNPJ)
-            elif 'cnpj' in column.lower() or 'cpf' in column.lower():
-                for row in range(2, len(df) + 2):
-                    cell = worksheet[f'{column_letter}{row}']
-                    cell.alignment = Alignment(horizontal='center')
-    
-    def _adjust_column_widths(self, worksheet, df: pd.DataFrame):
-        """
-        Ajusta largura das colunas automaticamente
-        
+        Cria o formato de cada coluna baseado em seu tipo de dado
+
         Args:
-            worksheet: Worksheet do openpyxl
+            workbook: Workbook do xlsxwriter
             df: DataFrame original
+            borders: Se inclui bordas
+
+        Returns:
+            Lista de formatos (um por coluna)
         """
-        for idx, column in enumerate(df.columns, 1):
-            column_letter = get_column_letter(idx)
-            
-            # Calcula largura baseada no conteúdo
-            max_length = len(str(column))
-            
-            # Verifica os valores da coluna (primeiras 100 linhas)
-            for value in df[column].head(100):
-                try:
-                    if value and str(value) != 'None' and str(value) != '':
-                        if len(str(value)) > max_length:
-                            max_length = len(str(value))
-                except:
-                    pass
-            
-            # Define largura (mínimo 12, máximo 50)
-            adjusted_width = min(max(max_length + 2, 12), 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-    
-    def _apply_borders(self, worksheet, num_rows: int):
+        border = {'border': 1} if borders else {}
+        money_format = workbook.add_format({'num_format': 'R$ #,##0.00', 'align': 'right', **border})
+        date_format = workbook.add_format({'num_format': 'DD/MM/YYYY HH:MM', 'align': 'center', **border})
+        center_format = workbook.add_format({'align': 'center', **border})
+        default_format = workbook.add_format(border) if borders else None
+
+        # Um formato por tipo de coluna
+        formats_by_kind = {
+            'monetary': money_format,
+            'date': date_format,
+            'document': center_format,
+            None: default_format
+        }
+
+        return [formats_by_kind[self._column_kind(column, dtype)]
+                for column, dtype in df.dtypes.items()]
+
+    def _column_kind(self, column: str, dtype) -> str:
+        """
+        Identifica o tipo de formatação da coluna na planilha
+
+        Args:
+            column: Nome da coluna
+            dtype: Tipo de dado da coluna
+
+        Returns:
+            'monetary', 'date', 'document' ou None
+        """
+        # Formata colunas monetárias
+        if self._is_monetary_column(column):
+            return 'monetary'
+
+        name = column.lower()
+
+        # Formata colunas de data
+        if 'data' in name or pd.api.types.is_datetime64_any_dtype(dtype):
+            return 'date'
+
+        # Centraliza colunas de documento (CPF/CNPJ)
+        if 'cnpj' in name or 'cpf' in name:
+            return 'document'
+
+        return None
+
+    def _prepare_values(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Garante valores numéricos nas colunas monetárias antes da escrita
+
+        Args:
+            df: DataFrame sem valores nulos
+
+        Returns:
+            DataFrame com colunas monetárias convertidas
+        """
+        prepared = {}
+
+        for column in df.columns:
+            if not self._is_monetary_column(column) or pd.api.types.is_numeric_dtype(df[column]):
+                continue
+
+            # Valores inválidos viram 0.0; células vazias permanecem vazias
+            numeric = pd.to_numeric(df[column], errors='coerce')
+            empty = df[column].astype(str).str.strip() == ''
+            prepared[column] = numeric.fillna(0.0).astype(object).mask(empty, '')
+
+        return df.assign(**prepared) if prepared else df
+
+    def _fill_missing(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Substitui valores nulos por ''
+
+        Colunas category (textos repetidos da sessão) não aceitam '' fora das
+        categorias e são convertidas para object antes do preenchimento.
+
+        Args:
+            df: DataFrame a exportar
+
+        Returns:
+            DataFrame sem valores nulos (exceto NaT em colunas de data)
+        """
+        categorical = {
+            column: df[column].astype(object)
+            for column in df.columns
+            if isinstance(df[column].dtype, pd.CategoricalDtype)
+        }
+        if categorical:
+            df = df.assign(**categorical)
+
+        return df.fillna('')
+
+    def _blank_missing_dates(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Substitui NaT por '' nas colunas de data (o xlsxwriter não escreve NaT)
+
+        Args:
+            df: DataFrame a escrever
+
+        Returns:
+            DataFrame com as colunas de data sem NaT
+        """
+        blanked = {}
+
+        for column in df.columns:
+            values = df[column]
+            if pd.api.types.is_datetime64_any_dtype(values) and values.isna().any():
+                blanked[column] = values.astype(object).where(values.notna(), '')
+
+        return df.assign(**blanked) if blanked else df
+
+    def _adjust_column_widths(self, df: pd.DataFrame) -> list:
         """
-        Aplica bordas nas células
-        
+        Calcula a largura das colunas automaticamente
+
         Args:
-            worksheet: Worksheet do openpyxl
-            num_rows: Número de linhas de dados
-        """
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Aplica bordas em todas as células com dados
-        for row in worksheet.iter_rows(min_row=1, max_row=num_rows + 1):
-            for cell in row:
-                cell.border = thin_border
-    
+            df: DataFrame original
+
+        Returns:
+            Lista de larguras (uma por coluna)
+        """
+        # Textos das primeiras 100 linhas, convertidos de uma vez
+        sample = df.head(100).astype(str)
+        widths = []
+
+        for idx, column in enumerate(df.columns):
+            # Calcula largura baseada no conteúdo (maior texto ou o cabeçalho)
+            lengths = sample.iloc[:, idx].str.len()
+            max_length = max(len(str(column)), int(lengths.max()) if len(lengths) else 0)
+
+            # Define largura (mínimo 12, máximo 50)
+            widths.append(min(max(max_length + 2, 12), 50))
+
+        return widths
+
     def _is_monetary_column(self, column_name: str) -> bool:
         """Verifica se coluna contém valores monetários"""
-        monetary_keywords = ['valor', 'total', 'preco', 'preço', 'custo', 'desconto']
-        return any(keyword in column_name.lower() for keyword in monetary_keywords)
-    
+        return bool(_MONETARY_RE.search(column_name))
+
     def export_with_summary(self, df: pd.DataFrame) -> BytesIO:
         """
         Exporta Excel com uma aba de resumo adicional
-        
+
         Args:
             df: DataFrame a exportar
-            
+
         Returns:
             BytesIO com o Excel
         """
         if df.empty:
             return None
-        
+
         output = BytesIO()
-        
+
         try:
             # Remove valores None
-            df_clean = df.copy()
-            df_clean = df_clean.fillna('')
-            
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                # Aba de dados
-                df_clean.to_excel(writer, index=False, sheet_name='Dados')
-                
-                # Aba de resumo
-                summary_data = self._create_summary(df_clean)
-                summary_df = pd.DataFrame(list(summary_data.items()), 
-                                         columns=['Métrica', 'Valor'])
-                summary_df.to_excel(writer, index=False, sheet_name='Resumo')
-                
-                # Formata ambas as abas
-                for sheet_name in writer.sheets:
-                    worksheet = writer.sheets[sheet_name]
-                    self._format_header(worksheet)
-                    if sheet_name == 'Dados':
-                        self._format_columns(worksheet, df_clean)
-                        self._adjust_column_widths(worksheet, df_clean)
-                    else:
-                        self._adjust_column_widths(worksheet, summary_df)
-            
+            df_clean = self._fill_missing(df)
+
+            # Aba de resumo
+            summary_data = self._create_summary(df_clean)
+            summary_df = pd.DataFrame(list(summary_data.items()),
+                                     columns=['Métrica', 'Valor'])
+
+            with xlsxwriter.Workbook(output, self.workbook_options) as workbook:
+                self._write_sheet(workbook, 'Dados', df_clean, format_columns=True)
+                self._write_sheet(workbook, 'Resumo', summary_df)
+
             output.seek(0)
             return output
-        
+
         except Exception as e:
             logger.error(f"Erro ao exportar Excel com resumo: {e}")
             return None
-    
+
     def _create_summary(self, df: pd.DataFrame) -> dict:
         """
         Cria resumo estatístico do DataFrame
-        
+
         Args:
             df: DataFrame
-            
+
         Returns:
             Dicionário com métricas
         """
@@ -230,11 +316,15 @@ class ExcelExporter:
             'Total de Registros': len(df),
             'Data de Geração': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
         }
-        
-        # Adiciona soma de colunas monetárias
-        for column in df.columns:
-            if self._is_monetary_column(column) and pd.api.types.is_numeric_dtype(df[column]):
-                total = df[column].sum()
-                summary[f'Total {column}'] = f"R$ {total:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        
-        return summary
\ No newline at end of file
+
+        # Adiciona soma de colunas monetárias (todas somadas de uma vez)
+        monetary_columns = [
+            column for column, dtype in df.dtypes.items()
+            if self._is_monetary_column(column) and pd.api.types.is_numeric_dtype(dtype)
+        ]
+        totals = df[monetary_columns].sum()
+
+        for column, total in totals.items():
+            summary[f'Total {column}'] = format_currency(total)
+
+        return summary
@@ -7,6 +7,7 @@ from .xml_parser import XMLParser
 from .data_filter import DataFilter
 from .data_formatter import DataFormatter
 from .excel_exporter import ExcelExporter
+from .parquet_exporter import ParquetExporter
 from .dashboard_builder import DashboardBuilder
 
 __all__ = [
@@ -15,5 +16,6 @@ __all__ = [
     'DataFilter',
     'DataFormatter',
     'ExcelExporter',
+    'ParquetExporter',
     'DashboardBuilder'
 ]
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+Módulo responsável pela exportação de dados para Parquet
+"""
+import pandas as pd
+from io import BytesIO
+from utils.logger import logger
+
+class ParquetExporter:
+    """Exporta DataFrames para arquivos Parquet (para uso em pipelines de dados)"""
+
+    def __init__(self):
+        self.engine = 'pyarrow'
+        self.compression = 'zstd'
+
+    def export_to_parquet(self, df: pd.DataFrame) -> BytesIO:
+        """
+        Exporta DataFrame para Parquet
+
+        Args:
+            df: DataFrame a exportar
+
+        Returns:
+            BytesIO com o conteúdo do Parquet
+        """
+        if df.empty:
+            logger.warning("DataFrame vazio, nada para exportar")
+            return None
+
+        output = BytesIO()
+
+        try:
+            df_typed = self._restore_types(df)
+            df_typed.to_parquet(output, engine=self.engine,
+                                compression=self.compression, index=False)
+
+            output.seek(0)
+            logger.info(f"Parquet exportado com sucesso: {len(df)} linhas")
+            return output
+
+        except Exception as e:
+            logger.error(f"Erro ao exportar Parquet: {e}")
+            return None
+
+    def _restore_types(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Volta células vazias ('') para nulos nas colunas mistas
+
+        O processamento preenche nulos com '' para o Excel; no Parquet cada
+        coluna precisa de um único tipo (ex: datas com NaT).
+
+        Args:
+            df: DataFrame processado
+
+        Returns:
+            DataFrame com tipos consistentes por coluna
+        """
+        restored = {}
+
+        for column in df.columns:
+            if df[column].dtype != 'object':
+                continue
+            if pd.api.types.infer_dtype(df[column], skipna=True) == 'string':
+                continue
+            series = df[column].replace('', None).infer_objects()
+
+            # Tipos ainda misturados são gravados como texto
+            if series.dtype == 'object' and pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+                series = series.astype('string')
+
+            restored[column] = series
+
+        return df.assign(**restored) if restored else df
@@ -1,10 +1,11 @@
 """
 Módulo responsável pelo upload e extração de arquivos
 """
+import hashlib
 import zipfile
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import BinaryIO, List, Tuple
 import config
 from utils.logger import logger
 from utils.validators import validate_file_extension
@@ -14,6 +15,7 @@ class UploadHandler:
     
     def __init__(self):
         self.temp_dir = config.TEMP_DIR
+        self.max_workers = config.MAX_EXTRACT_WORKERS
         self.extracted_files = []
     
     def process_uploads(self, uploaded_files) -> Tuple[List[Tuple[str, bytes]], List[str]]:
@@ -32,38 +34,58 @@ class UploadHandler:
         if not uploaded_files:
             return xml_files, ["Nenhum arquivo enviado"]
         
-        for uploaded_file in uploaded_files:
-            try:
-                filename = uploaded_file.name
-                file_content = uploaded_file.read()
+        # Resultados na ordem de envio: lista de XMLs ou Future da extração
+        pending = []
+        
+        # ZIPs são extraídos em paralelo; XMLs avulsos entram diretamente
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for uploaded_file in uploaded_files:
+                try:
+                    filename = uploaded_file.name
+                    
+                    # Se for ZIP, agenda a extração dos XMLs internos. O upload
+                    # já é um BytesIO posicionável: o ZipFile lê direto dele,
+                    # sem copiar o arquivo inteiro
+                    if filename.lower().endswith('.zip'):
+                        uploaded_file.seek(0)
+                        future = executor.submit(self._extract_zip, filename, uploaded_file)
+                        pending.append((filename, future))
+                    
+                    # Se for XML, adiciona diretamente (o parser exige bytes;
+                    # getvalue independe da posição de leitura)
+                    elif filename.lower().endswith('.xml'):
+                        pending.append((filename, [(filename, uploaded_file.getvalue())]))
+                        logger.info(f"XML carregado: {filename}")
+                    
+                    else:
+                        errors.append(f"Tipo de arquivo não suportado: {filename}")
+                
+                except Exception as e:
+                    errors.append(f"Erro ao processar {uploaded_file.name}: {str(e)}")
+                    logger.error(f"Erro ao processar arquivo: {e}")
+            
+            for filename, result in pending:
+                if isinstance(result, list):
+                    xml_files.extend(result)
+                    continue
                 
-                # Se for ZIP, extrai e processa XMLs internos
-                if filename.lower().endswith('.zip'):
-                    extracted = self._extract_zip(filename, file_content)
+                try:
+                    extracted = result.result()
                     xml_files.extend(extracted)
                     logger.info(f"ZIP extraído: {filename} ({len(extracted)} XMLs)")
-                
-                # Se for XML, adiciona diretamente
-                elif filename.lower().endswith('.xml'):
-                    xml_files.append((filename, file_content))
-                    logger.info(f"XML carregado: {filename}")
-                
-                else:
-                    errors.append(f"Tipo de arquivo não suportado: {filename}")
-            
-            except Exception as e:
-                errors.append(f"Erro ao processar {uploaded_file.name}: {str(e)}")
-                logger.error(f"Erro ao processar arquivo: {e}")
+                except Exception as e:
+                    errors.append(f"Erro ao processar {filename}: {str(e)}")
+                    logger.error(f"Erro ao processar arquivo: {e}")
         
         return xml_files, errors
     
-    def _extract_zip(self, zip_name: str, zip_content: bytes) -> List[Tuple[str, bytes]]:
+    def _extract_zip(self, zip_name: str, zip_file: BinaryIO) -> List[Tuple[str, bytes]]:
         """
         Extrai XMLs de um arquivo ZIP
         
         Args:
             zip_name: Nome do arquivo ZIP
-            zip_content: Conteúdo binário do ZIP
+            zip_file: Arquivo ZIP binário e posicionável (ex: upload do Streamlit)
             
         Returns:
             Lista de tuplas (nome_arquivo, conteúdo_xml)
@@ -71,27 +93,21 @@ class UploadHandler:
         xml_files = []
         
         try:
-            # Cria arquivo temporário para o ZIP
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp_zip:
-                tmp_zip.write(zip_content)
-                tmp_zip_path = tmp_zip.name
-            
-            # Extrai conteúdo
-            with zipfile.ZipFile(tmp_zip_path, 'r') as zip_ref:
-                for file_info in zip_ref.filelist:
-                    # Ignora diretórios e arquivos ocultos
-                    if file_info.is_dir() or file_info.filename.startswith('.'):
+            # Lê o ZIP direto da memória (sem gravar arquivo temporário)
+            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+                for file_info in zip_ref.infolist():
+                    # Usa apenas o nome do arquivo, não o path completo
+                    filename = file_info.filename.rpartition('/')[2]
+                    
+                    # Ignora diretórios, arquivos ocultos (ex: "._nota.xml" do macOS) e entradas vazias
+                    if file_info.is_dir() or filename.startswith('.') or file_info.file_size == 0:
                         continue
                     
-                    # Processa apenas XMLs
-                    if file_info.filename.lower().endswith('.xml'):
-                        xml_content = zip_ref.read(file_info.filename)
-                        # Usa apenas o nome do arquivo, não o path completo
-                        filename = Path(file_info.filename).name
+                    # Processa apenas XMLs (compara só a extensão, sem copiar o path inteiro)
+                    if filename[-4:].lower() == '.xml':
+                        # Lê pela própria entrada (sem nova busca por nome no índice)
+                        xml_content = zip_ref.read(file_info)
                         xml_files.append((filename, xml_content))
-            
-            # Remove arquivo temporário
-            Path(tmp_zip_path).unlink(missing_ok=True)
         
         except zipfile.BadZipFile:
             logger.error(f"Arquivo ZIP corrompido: {zip_name}")
@@ -100,6 +116,33 @@ class UploadHandler:
         
         return xml_files
     
+    def remove_duplicate_files(self, xml_files: List[Tuple[str, bytes]]) -> Tuple[List[Tuple[str, bytes]], int]:
+        """
+        Remove XMLs com conteúdo idêntico (mantém a primeira ocorrência)
+        
+        Args:
+            xml_files: Lista de tuplas (nome_arquivo, conteúdo_xml)
+            
+        Returns:
+            Tupla (lista sem repetições, quantidade removida)
+        """
+        seen = set()
+        unique_files = []
+        
+        for filename, xml_content in xml_files:
+            # Hash de 128 bits do conteúdo (BLAKE2b é mais rápido que SHA-256)
+            digest = hashlib.blake2b(xml_content, digest_size=16).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            unique_files.append((filename, xml_content))
+        
+        removed_count = len(xml_files) - len(unique_files)
+        if removed_count > 0:
+            logger.info(f"Ignorados {removed_count} XMLs com conteúdo repetido")
+        
+        return unique_files, removed_count
+    
     def cleanup(self):
         """Remove arquivos temporários"""
         try:
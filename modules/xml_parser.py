@@ -1,18 +1,209 @@
 """
 Módulo responsável por fazer parse de XMLs e converter em DataFrames
 """
-import xmltodict
+import hashlib
+import logging
+import multiprocessing
 import pandas as pd
+from lxml import etree
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Dict, Any
 import config
 from utils.logger import logger
-from utils.helpers import get_nested_value, safe_float, parse_date
+from utils.helpers import safe_float, parse_date
+
+# Parser libxml2 reutilizado (sem resolução de entidades externas)
+_XML_PARSER = etree.XMLParser(resolve_entities=False, huge_tree=False)
+
+def _local_name(element) -> str:
+    """Retorna o nome da tag sem o namespace"""
+    return etree.QName(element).localname
+
+def _element_value(element) -> str:
+    """Retorna o texto de um elemento (sem espaços) ou None se vazio"""
+    text = element.text
+    if text is None:
+        return None
+    text = text.strip()
+    return text or None
+
+def _compile_path(path: str) -> etree.XPath:
+    """
+    Compila um caminho com notação de ponto em uma XPath independente de namespace
+    Exemplo: 'emit.CNPJ' -> /*[local-name()='emit']/*[local-name()='CNPJ']
+    
+    Args:
+        path: Caminho das chaves separado por ponto ('@' indica atributo)
+        
+    Returns:
+        Expressão XPath compilada
+    """
+    steps = []
+    for key in path.split('.'):
+        if key.startswith('@'):
+            steps.append(key)
+        else:
+            steps.append(f"*[local-name()='{key}']")
+    return etree.XPath('/' + '/'.join(steps), smart_strings=False)
+
+def _compile_qualified_path(path: str, namespace: str) -> etree.XPath:
+    """
+    Compila um caminho com notação de ponto em uma XPath para um namespace fixo
+    Exemplo: 'emit.CNPJ' -> /n:emit/n:CNPJ
+    
+    O teste de nome é resolvido pela libxml2 sem chamar local-name() em cada
+    irmão, o que é bem mais rápido em notas com muitos itens (<det>).
+    
+    Args:
+        path: Caminho das chaves separado por ponto ('@' indica atributo)
+        namespace: URI do namespace dos elementos (None para sem namespace)
+        
+    Returns:
+        Expressão XPath compilada
+    """
+    prefix = 'n:' if namespace else ''
+    steps = [key if key.startswith('@') else f"{prefix}{key}" for key in path.split('.')]
+    namespaces = {'n': namespace} if namespace else None
+    return etree.XPath('/' + '/'.join(steps), namespaces=namespaces, smart_strings=False)
+
+def _field_paths_for_root(field_mapping: Dict[str, List[str]], root_name: str,
+                          namespace: str) -> Dict[str, List[tuple]]:
+    """
+    Compila, para cada campo, apenas os caminhos que começam pela tag raiz
+    
+    Os caminhos são absolutos: um caminho cujo primeiro nível difere da raiz
+    nunca encontra nada, então nem é avaliado.
+    
+    Args:
+        field_mapping: Mapeamento {campo: [caminhos]} do parser
+        root_name: Nome local do elemento raiz
+        namespace: URI do namespace do elemento raiz (None para sem namespace)
+        
+    Returns:
+        Dicionário {campo: [(caminho, xpath_qualificada, xpath_sem_namespace)]}
+        na ordem de prioridade do mapeamento
+    """
+    return {
+        field_name: [
+            (path, _compile_qualified_path(path, namespace), _compile_path(path))
+            for path in paths
+            if path.split('.', 1)[0] == root_name
+        ]
+        for field_name, paths in field_mapping.items()
+    }
+
+# Busca de reserva quando nenhum caminho configurado encontra o campo:
+# (termos do nome do campo, tags aceitas, tag de contexto priorizada)
+_FALLBACK_RULES = (
+    (('Nota',), ('nNF', 'numero'), None),
+    (('Número',), ('nNF', 'numero'), None),
+    (('Data', 'Emissão'), ('dhEmi', 'dEmi', 'dataEmissao'), None),
+    (('CNPJ', 'Emitente'), ('CNPJ',), 'emit'),
+    (('Nome', 'Emitente'), ('xNome', 'nome'), 'emit'),
+    (('CNPJ', 'Destinatário'), ('CNPJ',), 'dest'),
+    (('Nome', 'Destinatário'), ('xNome', 'nome'), 'dest'),
+    (('Valor Total',), ('vNF', 'valorNF', 'vTotal'), None),
+    (('Valor Produtos',), ('vProd', 'valorProd'), None),
+    (('Chave',), ('chNFe', 'chave'), None)
+)
+
+def _fallback_search(field_name: str) -> tuple:
+    """
+    Monta a busca por nome de tag de um campo (em qualquer namespace)
+    
+    Args:
+        field_name: Nome do campo (ex: 'CNPJ Emitente')
+        
+    Returns:
+        Tupla (tag de contexto ou None, tags aceitas) ou None se o campo não tem busca
+    """
+    for terms, tags, context in _FALLBACK_RULES:
+        if all(term in field_name for term in terms):
+            return (f'{{*}}{context}' if context else None,
+                    tuple(f'{{*}}{tag}' for tag in tags))
+    return None
+
+def _field_kind(field_name: str) -> str:
+    """
+    Identifica a conversão aplicada ao valor do campo
+    
+    Args:
+        field_name: Nome do campo (ex: 'Valor Total')
+        
+    Returns:
+        'monetary', 'date' ou None
+    """
+    name = field_name.lower()
+    if 'valor' in name or 'total' in name:
+        return 'monetary'
+    if 'data' in name:
+        return 'date'
+    return None
+
+# Parser reutilizado por cada processo do pool
+_worker_parser = None
+
+def _init_worker(field_mapping: Dict[str, List[str]]):
+    """
+    Cria o parser do processo do pool com o mapeamento de campos do pai
+    
+    Args:
+        field_mapping: Mapeamento {campo: [caminhos]} do parser original
+    """
+    global _worker_parser
+    _worker_parser = XMLParser()
+    _worker_parser.field_mapping = field_mapping
+
+def _parse_xml_worker(xml_file: Tuple[str, bytes]) -> Dict[str, Any]:
+    """
+    Faz parse de um XML dentro de um processo do pool
+    
+    Args:
+        xml_file: Tupla (nome_arquivo, conteúdo_xml)
+        
+    Returns:
+        Dicionário com dados extraídos ou None
+    """
+    filename, xml_content = xml_file
+    try:
+        return _worker_parser._parse_single_xml(filename, xml_content)
+    except Exception as e:
+        logger.error(f"Erro ao processar {filename}: {e}")
+        return None
 
 class XMLParser:
     """Converte arquivos XML em DataFrames pandas"""
     
     def __init__(self):
         self.field_mapping = config.DEFAULT_XML_FIELDS
+        self.parallel_min_files = config.PARALLEL_PARSE_MIN_FILES
+        self.max_workers = config.MAX_PARSE_WORKERS
+    
+    @property
+    def field_mapping(self) -> Dict[str, List[str]]:
+        """Mapeamento {campo: [caminhos]} usado na extração"""
+        return self._field_mapping
+    
+    @field_mapping.setter
+    def field_mapping(self, field_mapping: Dict[str, List[str]]):
+        """
+        Define o mapeamento de campos e recalcula o que deriva dele
+        
+        XPaths (por elemento raiz), buscas de reserva e conversões são
+        preparadas uma vez por mapeamento, e não a cada XML. Para alterar o
+        mapeamento, atribua um novo dicionário.
+        
+        Args:
+            field_mapping: Mapeamento {campo: [caminhos]}
+        """
+        self._field_mapping = field_mapping
+        self._root_field_paths = {}
+        self._fallback_searches = {
+            field_name: _fallback_search(field_name) for field_name in field_mapping
+        }
+        self._field_kinds = {
+            field_name: _field_kind(field_name) for field_name in field_mapping
+        }
     
     def parse_multiple_xmls(self, xml_files: List[Tuple[str, bytes]]) -> pd.DataFrame:
         """
@@ -24,30 +215,145 @@ class XMLParser:
         Returns:
             DataFrame consolidado
         """
-        all_data = []
+        # XMLs com conteúdo idêntico são parseados uma única vez
+        unique_files, unique_index = self._group_duplicates(xml_files)
         
-        for filename, xml_content in xml_files:
-            try:
-                parsed_data = self._parse_single_xml(filename, xml_content)
-                if parsed_data:
-                    all_data.append(parsed_data)
-            except Exception as e:
-                logger.error(f"Erro ao processar {filename}: {e}")
+        if len(unique_files) >= self.parallel_min_files and self.max_workers > 1:
+            results = self._parse_parallel(unique_files)
+        else:
+            results = self._parse_serial(unique_files)
+        
+        # Uma linha por arquivo enviado; repetições reaproveitam o resultado
+        # com o próprio nome de arquivo. Falhas de parse retornam None.
+        all_data = []
+        for (filename, _), index in zip(xml_files, unique_index):
+            parsed_data = results[index]
+            if parsed_data is None:
                 continue
+            if parsed_data['_arquivo_origem'] != filename:
+                parsed_data = {**parsed_data, '_arquivo_origem': filename}
+            all_data.append(parsed_data)
         
         if not all_data:
             return pd.DataFrame()
         
-        # Converte lista de dicts em DataFrame
-        df = pd.DataFrame(all_data)
+        # Converte lista de dicts em DataFrame (de uma vez, com colunas fixas)
+        columns = list(self.field_mapping) + ['_arquivo_origem']
+        df = pd.DataFrame.from_records(all_data, columns=columns)
+        self._log_missing_fields(df)
+        df = self._apply_dtypes(df)
         
         # Adiciona informações de processamento
-        df['_arquivo_origem'] = df['_arquivo_origem'].astype(str)
         df['_data_processamento'] = pd.Timestamp.now()
         
         logger.info(f"DataFrame criado com {len(df)} registros e {len(df.columns)} colunas")
         return df
     
+    def _group_duplicates(self, xml_files: List[Tuple[str, bytes]]) -> Tuple[List[Tuple[str, bytes]], List[int]]:
+        """
+        Agrupa XMLs com conteúdo idêntico pelo hash do conteúdo
+        
+        Args:
+            xml_files: Lista de tuplas (nome_arquivo, conteúdo_xml)
+            
+        Returns:
+            Tupla (XMLs únicos, posição em XMLs únicos de cada arquivo de entrada)
+        """
+        positions = {}
+        unique_files = []
+        unique_index = []
+        
+        for filename, xml_content in xml_files:
+            # Mesmo hash usado pelo UploadHandler (BLAKE2b de 128 bits)
+            digest = hashlib.blake2b(xml_content, digest_size=16).digest()
+            if digest not in positions:
+                positions[digest] = len(unique_files)
+                unique_files.append((filename, xml_content))
+            unique_index.append(positions[digest])
+        
+        return unique_files, unique_index
+    
+    def _log_missing_fields(self, df: pd.DataFrame):
+        """
+        Registra um único aviso por campo não encontrado, com a contagem de arquivos
+        
+        Args:
+            df: DataFrame recém-montado (uma linha por arquivo)
+        """
+        fields = [field for field in self.field_mapping if field in df.columns]
+        missing = (df[fields].isna() | df[fields].eq('')).sum()
+        
+        for field_name, count in missing[missing > 0].items():
+            logger.warning(f"{field_name}: NÃO ENCONTRADO em {count} de {len(df)} arquivo(s)")
+    
+    def _apply_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Aplica os tipos definidos em config.COLUMN_DTYPES
+        
+        Colunas que não aceitam o tipo (ex: datas em formato desconhecido)
+        permanecem como estão.
+        
+        Args:
+            df: DataFrame recém-montado
+            
+        Returns:
+            DataFrame tipado
+        """
+        typed_columns = {}
+        
+        for column, dtype in config.COLUMN_DTYPES.items():
+            if column not in df.columns:
+                continue
+            try:
+                typed_columns[column] = df[column].astype(dtype)
+            except (TypeError, ValueError) as e:
+                logger.debug(f"Coluna {column} mantida sem tipo {dtype}: {e}")
+        
+        return df.assign(**typed_columns) if typed_columns else df
+    
+    def _parse_parallel(self, xml_files: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+        """
+        Faz parse dos XMLs em paralelo usando um pool de processos
+        
+        Args:
+            xml_files: Lista de tuplas (nome_arquivo, conteúdo_xml)
+            
+        Returns:
+            Lista de dicionários extraídos (None para falhas), na ordem de entrada
+        """
+        try:
+            # 'spawn' evita herdar as threads do servidor Streamlit via fork
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                     initializer=_init_worker,
+                                     initargs=(self.field_mapping,)) as executor:
+                return list(executor.map(_parse_xml_worker, xml_files,
+                                         chunksize=config.PARSE_CHUNKSIZE))
+        except Exception as e:
+            logger.warning(f"Parse paralelo indisponível, processando em série: {e}")
+            return self._parse_serial(xml_files)
+    
+    def _parse_serial(self, xml_files: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+        """
+        Faz parse dos XMLs em sequência no processo atual
+        
+        Args:
+            xml_files: Lista de tuplas (nome_arquivo, conteúdo_xml)
+            
+        Returns:
+            Lista de dicionários extraídos (None para falhas), na ordem de entrada
+        """
+        results = []
+        
+        for filename, xml_content in xml_files:
+            try:
+                results.append(self._parse_single_xml(filename, xml_content))
+            except Exception as e:
+                logger.error(f"Erro ao processar {filename}: {e}")
+                results.append(None)
+        
+        return results
+    
     def _parse_single_xml(self, filename: str, xml_content: bytes) -> Dict[str, Any]:
         """
         Faz parse de um único XML com busca aprimorada
@@ -60,18 +366,15 @@ class XMLParser:
             Dicionário com dados extraídos
         """
         try:
-            # Converte bytes para string
-            xml_string = xml_content.decode('utf-8', errors='ignore')
+            # Parse direto dos bytes (libxml2 detecta o encoding declarado)
+            root = etree.fromstring(xml_content, parser=_XML_PARSER)
             
-            # Parse XML para dicionário
-            xml_dict = xmltodict.parse(xml_string)
-            
-            # DEBUG: Log da estrutura encontrada
-            logger.info(f"Processando: {filename}")
-            logger.debug(f"Chaves raiz do XML: {list(xml_dict.keys())}")
+            # DEBUG: Log da estrutura encontrada (só monta a mensagem se o nível estiver ativo)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Processando: %s (elemento raiz: %s)", filename, _local_name(root))
             
             # Extrai dados baseado no mapeamento de campos
-            extracted_data = self._extract_fields_enhanced(xml_dict, filename)
+            extracted_data = self._extract_fields_enhanced(root, filename)
             
             # Adiciona metadados
             extracted_data['_arquivo_origem'] = filename
@@ -82,113 +385,126 @@ class XMLParser:
             logger.error(f"Erro ao parsear {filename}: {e}")
             return None
     
-    def _extract_fields_enhanced(self, xml_dict: Dict, filename: str) -> Dict[str, Any]:
+    def _extract_fields_enhanced(self, root, filename: str) -> Dict[str, Any]:
         """
         Extrai campos com busca recursiva melhorada
         
         Args:
-            xml_dict: Dicionário convertido do XML
+            root: Elemento raiz do XML (lxml)
             filename: Nome do arquivo (para debug)
             
         Returns:
             Dicionário com campos extraídos
         """
         data = {}
+        debug = logger.isEnabledFor(logging.DEBUG)
+        
+        # Caminhos que podem casar com esta raiz; na NFe todos os elementos
+        # costumam estar no namespace da raiz
+        root_name = etree.QName(root)
+        root_key = (root_name.localname, root_name.namespace)
+        field_paths = self._root_field_paths.get(root_key)
+        if field_paths is None:
+            field_paths = _field_paths_for_root(self.field_mapping, *root_key)
+            self._root_field_paths[root_key] = field_paths
         
         # Para cada campo no mapeamento
-        for field_name, possible_paths in self.field_mapping.items():
+        for field_name, candidate_paths in field_paths.items():
             value = None
             found_path = None
             
-            # Tenta cada path possível
-            for path in possible_paths:
-                value = get_nested_value(xml_dict, path)
+            # Tenta cada path possível (primeiro no namespace da raiz, depois
+            # em qualquer namespace)
+            for path, qualified_xpath, xpath in candidate_paths:
+                value = self._get_path_value(root, qualified_xpath)
+                if value is None:
+                    value = self._get_path_value(root, xpath)
                 if value is not None and value != '':
                     found_path = path
                     break
             
-            # Se não encontrou, tenta busca recursiva
+            # Se não encontrou, busca as tags do campo em qualquer nível
             if value is None or value == '':
-                # Busca por palavras-chave
-                if 'Nota' in field_name or 'Número' in field_name:
-                    value = self._search_recursive(xml_dict, ['nNF', 'numero'])
-                elif 'Data' in field_name and 'Emissão' in field_name:
-                    value = self._search_recursive(xml_dict, ['dhEmi', 'dEmi', 'dataEmissao'])
-                elif 'CNPJ' in field_name and 'Emitente' in field_name:
-                    value = self._search_recursive(xml_dict, ['CNPJ'], context='emit')
-                elif 'Nome' in field_name and 'Emitente' in field_name:
-                    value = self._search_recursive(xml_dict, ['xNome', 'nome'], context='emit')
-                elif 'CNPJ' in field_name and 'Destinatário' in field_name:
-                    value = self._search_recursive(xml_dict, ['CNPJ'], context='dest')
-                elif 'Nome' in field_name and 'Destinatário' in field_name:
-                    value = self._search_recursive(xml_dict, ['xNome', 'nome'], context='dest')
-                elif 'Valor Total' in field_name:
-                    value = self._search_recursive(xml_dict, ['vNF', 'valorNF', 'vTotal'])
-                elif 'Valor Produtos' in field_name:
-                    value = self._search_recursive(xml_dict, ['vProd', 'valorProd'])
-                elif 'Chave' in field_name:
-                    value = self._search_recursive(xml_dict, ['chNFe', 'chave'])
+                value = self._search_fallback(root, field_name)
             
             # Processa o valor encontrado
+            # (campos não encontrados são resumidos em _log_missing_fields)
             if value is not None and value != '':
+                kind = self._field_kinds.get(field_name)
+                
                 # Converte valores monetários
-                if 'valor' in field_name.lower() or 'total' in field_name.lower():
+                if kind == 'monetary':
                     value = safe_float(value)
-                    if found_path:
-                        logger.debug(f"{field_name}: {value} (encontrado em: {found_path})")
                 
                 # Converte datas
-                elif 'data' in field_name.lower():
+                elif kind == 'date':
                     parsed_date = parse_date(str(value))
                     value = parsed_date if parsed_date else value
-                    if found_path:
-                        logger.debug(f"{field_name}: {value} (encontrado em: {found_path})")
-            else:
-                # Log quando não encontra
-                logger.warning(f"{field_name}: NÃO ENCONTRADO em {filename}")
+                
+                if debug and found_path:
+                    logger.debug("%s: %s (encontrado em: %s)", field_name, value, found_path)
             
             data[field_name] = value
         
         return data
     
-    def _search_recursive(self, data: Any, keys: List[str], context: str = None, 
-                         current_path: str = "") -> Any:
+    def _get_path_value(self, root, xpath: etree.XPath) -> Any:
         """
-        Busca recursiva por chaves em estruturas aninhadas
+        Avalia uma XPath compilada e retorna o primeiro valor encontrado
         
         Args:
-            data: Dados para buscar (dict, list, ou valor)
-            keys: Lista de possíveis nomes de chaves
-            context: Contexto opcional (ex: 'emit', 'dest')
-            current_path: Caminho atual (para debug)
+            root: Elemento raiz do XML
+            xpath: XPath compilada (elemento ou atributo)
             
         Returns:
             Valor encontrado ou None
         """
-        # Se encontrou contexto específico, prioriza
-        if isinstance(data, dict) and context:
-            if context in data:
-                result = self._search_recursive(data[context], keys, None, f"{current_path}.{context}")
-                if result is not None:
-                    return result
-        
-        # Busca em dicionários
-        if isinstance(data, dict):
-            for key, value in data.items():
-                # Verifica se a chave corresponde
-                if key in keys:
-                    logger.debug(f"Encontrado: {key} em {current_path}.{key}")
-                    return value
-                
-                # Busca recursiva
-                result = self._search_recursive(value, keys, context, f"{current_path}.{key}")
-                if result is not None:
-                    return result
+        matches = xpath(root)
+        if not matches:
+            return None
+        
+        value = matches[0]
+        if isinstance(value, str):
+            value = value.strip()
+        else:
+            value = _element_value(value)
+        
+        # Retorna None se valor for vazio ou "None"
+        if not value or value == "None":
+            return None
+        return value
+    
+    def _search_fallback(self, root, field_name: str) -> Any:
+        """
+        Busca o campo pelas tags conhecidas em qualquer nível do XML
+        
+        Com contexto (ex: 'emit'), o primeiro elemento de contexto é consultado
+        antes do documento inteiro. A varredura (iter da lxml) para no
+        primeiro valor encontrado.
+        
+        Args:
+            root: Elemento raiz do XML
+            field_name: Nome do campo
+            
+        Returns:
+            Primeiro valor não vazio encontrado (ordem do documento) ou None
+        """
+        search = self._fallback_searches.get(field_name)
+        if search is None:
+            return None
         
-        # Busca em listas (pega o primeiro item)
-        elif isinstance(data, list) and data:
-            return self._search_recursive(data[0], keys, context, f"{current_path}[0]")
+        context, tags = search
+        scopes = [root]
+        if context:
+            context_element = next(root.iter(context), None)
+            if context_element is not None:
+                scopes.insert(0, context_element)
         
+        for scope in scopes:
+            for element in scope.iter(*tags):
+                value = _element_value(element)
+                if value is not None:
+                    return value
         return None
     
     def get_available_fields(self, sample_xml: bytes) -> List[str]:
@@ -202,23 +518,22 @@ class XMLParser:
             Lista de campos encontrados
         """
         try:
-            xml_string = sample_xml.decode('utf-8', errors='ignore')
-            xml_dict = xmltodict.parse(xml_string)
+            root = etree.fromstring(sample_xml, parser=_XML_PARSER)
             
             # Extrai todas as chaves do XML (de forma recursiva)
-            fields = self._get_all_keys(xml_dict)
+            fields = self._get_all_keys([root])
             return sorted(list(set(fields)))
         
         except Exception as e:
             logger.error(f"Erro ao analisar campos disponíveis: {e}")
             return []
     
-    def _get_all_keys(self, d: Any, parent_key: str = '', sep: str = '.') -> List[str]:
+    def _get_all_keys(self, elements, parent_key: str = '', sep: str = '.') -> List[str]:
         """
-        Extrai todas as chaves de um dicionário aninhado recursivamente
+        Extrai todos os caminhos de elementos e atributos recursivamente
         
         Args:
-            d: Dicionário a analisar
+            elements: Elementos a analisar
             parent_key: Chave pai (para recursão)
             sep: Separador de níveis
             
@@ -227,16 +542,17 @@ class XMLParser:
         """
         keys = []
         
-        if isinstance(d, dict):
-            for k, v in d.items():
-                new_key = f"{parent_key}{sep}{k}" if parent_key else k
-                keys.append(new_key)
-                
-                if isinstance(v, (dict, list)):
-                    keys.extend(self._get_all_keys(v, new_key, sep))
-        
-        elif isinstance(d, list) and d:
-            # Analisa primeiro item da lista
-            keys.extend(self._get_all_keys(d[0], parent_key, sep))
+        for element in elements:
+            if not isinstance(element.tag, str):
+                continue
+            
+            new_key = f"{parent_key}{sep}{_local_name(element)}" if parent_key else _local_name(element)
+            keys.append(new_key)
+            
+            for attribute in element.attrib:
+                keys.append(f"{new_key}{sep}@{etree.QName(attribute).localname}")
+            
+            if len(element):
+                keys.extend(self._get_all_keys(element, new_key, sep))
         
         return keys
\ No newline at end of file
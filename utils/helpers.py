@@ -1,10 +1,19 @@
 """
 Funções auxiliares diversas
 """
+import functools
 import re
 from datetime import datetime
 from typing import Any, Dict, List
 
+# Padrões de limpeza de nomes de arquivos
+_FILENAME_SPECIAL_CHARS_RE = re.compile(r'[^\w\s\-.]')
+_SPACES_RE = re.compile(r'\s+')
+
+# Separadores de milhar/decimal: 1,234.56 -> 1.234,56
+_BR_NUMBER_TRANSLATION = str.maketrans({',': '.', '.': ','})
+
+@functools.lru_cache(maxsize=1024)
 def clean_filename(filename: str) -> str:
     """
     Remove caracteres especiais de nomes de arquivos
@@ -13,11 +22,11 @@ def clean_filename(filename: str) -> str:
         filename: Nome do arquivo
         
     Returns:
-        Nome limpo
+        Nome limpo (memoizado: os mesmos nomes se repetem entre reruns)
     """
     # Remove caracteres especiais, mantém apenas alfanuméricos, ponto e hífen
-    clean = re.sub(r'[^\w\s\-.]', '', filename)
-    clean = re.sub(r'\s+', '_', clean)
+    clean = _FILENAME_SPECIAL_CHARS_RE.sub('', filename)
+    clean = _SPACES_RE.sub('_', clean)
     return clean
 
 def format_currency(value: float, currency: str = "R$") -> str:
@@ -31,40 +40,93 @@ def format_currency(value: float, currency: str = "R$") -> str:
     Returns:
         String formatada
     """
-    try:
-        if value is None or value == "" or str(value) == "None":
+    # Caminho rápido: números dispensam as verificações de vazio
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        try:
+            if value is None or value == "" or str(value) == "None":
+                return f"{currency} 0,00"
+            value = float(value)
+        except:
             return f"{currency} 0,00"
-        value = float(value)
-        return f"{currency} {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except:
-        return f"{currency} 0,00"
+    
+    # Troca separadores para o padrão brasileiro em uma única passada
+    return f"{currency} {format(value, ',.2f').translate(_BR_NUMBER_TRANSLATION)}"
+
+# Deslocamento de fuso horário no fim da data (ex: -03:00)
+_TIMEZONE_RE = re.compile(r'[+-]\d{2}:?\d{2}$')
+
+# Formatos de data aceitos, na ordem de tentativa
+_DATE_FORMATS = (
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%Y%m%d'
+)
+
+# Formato por (tamanho, separador da data, caractere após a data); None usa
+# datetime.fromisoformat (implementado em C, mais rápido que strptime)
+_DATE_FORMATS_BY_SHAPE = {
+    (19, '-', 'T'): None,
+    (19, '-', ' '): None,
+    (19, '/', ' '): '%d/%m/%Y %H:%M:%S',
+    (10, '-', ''): None,
+    (10, '/', ''): '%d/%m/%Y',
+    (8, '', ''): '%Y%m%d'
+}
 
 def parse_date(date_string: str) -> datetime:
     """
     Converte string em datetime, tentando múltiplos formatos
     
+    Datas se repetem muito entre as notas; o resultado de cada texto fica em
+    cache (datetime é imutável, então pode ser compartilhado).
+    
     Args:
         date_string: String com data
         
     Returns:
         Objeto datetime ou None se falhar
     """
-    if not date_string or str(date_string) == "None" or date_string == "":
+    if not date_string:
+        return None
+    
+    # Só converte para texto o que ainda não é str
+    if not isinstance(date_string, str):
+        date_string = str(date_string)
+    if date_string == "None":
         return None
+    
+    return _parse_date_cached(date_string)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_cached(date_string: str) -> datetime:
+    """
+    Converte um texto de data já normalizado (resultado memoizado)
+    
+    Args:
+        date_string: String com data
         
-    # Remove timezone se existir (ex: -03:00)
-    date_string = str(date_string).split('-03:00')[0].split('+')[0].strip()
-    
-    formats = [
-        '%Y-%m-%dT%H:%M:%S',
-        '%Y-%m-%d %H:%M:%S',
-        '%d/%m/%Y %H:%M:%S',
-        '%Y-%m-%d',
-        '%d/%m/%Y',
-        '%Y%m%d'
-    ]
-    
-    for fmt in formats:
+    Returns:
+        Objeto datetime ou None se falhar
+    """
+    # Remove timezone se existir (ex: -03:00, -02:00, +00:00)
+    date_string = _TIMEZONE_RE.sub('', date_string.strip(), count=1).strip()
+    
+    # Formato deduzido pelo tamanho e separadores: uma única conversão, sem exceções
+    shape = (len(date_string), _date_separator(date_string), date_string[10:11])
+    if shape in _DATE_FORMATS_BY_SHAPE:
+        fmt = _DATE_FORMATS_BY_SHAPE[shape]
+        try:
+            if fmt is None:
+                return datetime.fromisoformat(date_string)
+            return datetime.strptime(date_string, fmt)
+        except ValueError:
+            pass
+    
+    # Formatos fora do padrão (ex: dia sem zero à esquerda): tenta um a um
+    for fmt in _DATE_FORMATS:
         try:
             return datetime.strptime(date_string, fmt)
         except:
@@ -72,6 +134,14 @@ def parse_date(date_string: str) -> datetime:
     
     return None
 
+def _date_separator(date_string: str) -> str:
+    """Retorna o separador da data ('-' para ISO, '/' para dd/mm/aaaa, '' sem separador)"""
+    if date_string[4:5] == '-':
+        return '-'
+    if date_string[2:3] == '/':
+        return '/'
+    return ''
+
 def get_nested_value(data: Dict, key_path: str, default: Any = None) -> Any:
     """
     Busca valor em dicionário aninhado usando notação de ponto
@@ -85,7 +155,7 @@ def get_nested_value(data: Dict, key_path: str, default: Any = None) -> Any:
     Returns:
         Valor encontrado ou default
     """
-    keys = key_path.split('.')
+    keys = _split_key_path(key_path)
     value = data
     
     try:
@@ -98,14 +168,20 @@ def get_nested_value(data: Dict, key_path: str, default: Any = None) -> Any:
             if value is None:
                 return default
         
-        # Retorna default se valor for vazio ou "None"
-        if value == "" or str(value) == "None":
+        # Retorna default se valor for vazio ou "None" (sem converter
+        # dicionários/listas em texto só para comparar)
+        if isinstance(value, str) and value in ("", "None"):
             return default
             
         return value
     except:
         return default
 
+@functools.lru_cache(maxsize=256)
+def _split_key_path(key_path: str) -> tuple:
+    """Separa o caminho de chaves (cache limitado: aceita caminhos arbitrários)"""
+    return tuple(key_path.split('.'))
+
 def safe_float(value: Any, default: float = 0.0) -> float:
     """
     Converte valor para float de forma segura
@@ -118,16 +194,33 @@ def safe_float(value: Any, default: float = 0.0) -> float:
         Float convertido
     """
     try:
-        # Verifica se é None ou string "None"
-        if value is None or value == "" or str(value).strip() in ["None", ""]:
+        # Caminho rápido: valores já numéricos (campos tipados) não passam por str
+        value_type = type(value)
+        if value_type is float:
+            return value
+        if value_type is int:
+            return float(value)
+        if value is None:
             return default
-            
+        
         if isinstance(value, str):
-            # Remove pontos de milhares e substitui vírgula por ponto
-            value = value.strip().replace('.', '').replace(',', '.')
+            value = value.strip()
+            # Verifica se é vazio ou string "None"
+            if value in ("", "None"):
+                return default
+            # Formato brasileiro ("1.234,56"): remove pontos de milhares e
+            # troca a vírgula decimal; valores do XML ("1234.56") ficam iguais
+            if ',' in value:
+                value = value.replace('.', '').replace(',', '.')
+            # Só pontos de milhares ("1.234.567"): mais de um ponto não é decimal
+            elif value.count('.') > 1:
+                value = value.replace('.', '')
+        
+        # Demais tipos (ex: numpy, Decimal)
+        elif value == "" or str(value).strip() in ["None", ""]:
+            return default
         
-        result = float(value)
-        return result
+        return float(value)
     except:
         return default
 
@@ -142,9 +235,12 @@ def safe_string(value: Any, default: str = "") -> str:
     Returns:
         String convertida
     """
-    if value is None or str(value).strip() == "None":
+    if value is None:
         return default
-    return str(value).strip()
+    
+    # Converte (se necessário) e remove espaços uma única vez
+    text = (value if isinstance(value, str) else str(value)).strip()
+    return default if text == "None" else text
 
 def truncate_text(text: str, max_length: int = 50) -> str:
     """
@@ -3,9 +3,19 @@ Sistema de logging para rastreamento e debugging
 """
 import logging
 import sys
+import threading
 from datetime import datetime
 from pathlib import Path
 
+# Formato personalizado (compartilhado por todos os handlers)
+_FORMATTER = logging.Formatter(
+    '%(asctime)s | %(levelname)s | %(name)s | %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Serializa a configuração: reruns do Streamlit rodam em threads diferentes
+_SETUP_LOCK = threading.Lock()
+
 def setup_logger(name: str = "xml_converter") -> logging.Logger:
     """
     Configura e retorna um logger personalizado
@@ -18,24 +28,22 @@ def setup_logger(name: str = "xml_converter") -> logging.Logger:
     """
     logger = logging.getLogger(name)
     
-    # Evita duplicação de handlers
+    # Evita duplicação de handlers (verificação e inclusão sob o mesmo lock)
     if logger.handlers:
         return logger
     
-    logger.setLevel(logging.INFO)
-    
-    # Handler para console
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    
-    # Formato personalizado
-    formatter = logging.Formatter(
-        '%(asctime)s | %(levelname)s | %(name)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(console_handler)
+    with _SETUP_LOCK:
+        if logger.handlers:
+            return logger
+        
+        logger.setLevel(logging.INFO)
+        
+        # Handler para console
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(_FORMATTER)
+        
+        logger.addHandler(console_handler)
     
     return logger
 
@@ -50,7 +58,8 @@ def log_operation(operation: str, details: str = ""):
         operation: Nome da operação
         details: Detalhes adicionais
     """
-    logger.info(f"{operation} {details}")
+    # Formatação adiada: a mensagem só é montada se o nível INFO estiver ativo
+    logger.info("%s %s", operation, details)
 
 def log_error(error: Exception, context: str = ""):
     """
@@ -60,4 +69,5 @@ def log_error(error: Exception, context: str = ""):
         error: Exceção capturada
         context: Contexto do erro
     """
-    logger.error(f"{context} | Erro: {str(error)}", exc_info=True)
\ No newline at end of file
+    # Traceback da própria exceção (funciona também fora do bloco except)
+    logger.error("%s | Erro: %s", context, error, exc_info=error)
\ No newline at end of file
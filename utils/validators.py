@@ -2,11 +2,20 @@
 Validadores de arquivos e dados
 """
 import os
-from pathlib import Path
 from typing import List, Tuple
+from lxml import etree
 import config
 from utils.logger import logger
 
+# Extensões permitidas por padrão (busca em conjunto)
+_ALLOWED_EXTENSIONS = frozenset(ext.lower() for ext in config.ALLOWED_EXTENSIONS)
+
+class _WellFormedTarget:
+    """Target da lxml que descarta os eventos do parse (só valida a sintaxe)"""
+    
+    def close(self):
+        return None
+
 def validate_file_extension(filename: str, allowed_extensions: List[str] = None) -> bool:
     """
     Valida se a extensão do arquivo é permitida
@@ -19,10 +28,15 @@ def validate_file_extension(filename: str, allowed_extensions: List[str] = None)
         True se válido, False caso contrário
     """
     if allowed_extensions is None:
-        allowed_extensions = config.ALLOWED_EXTENSIONS
+        allowed_extensions = _ALLOWED_EXTENSIONS
     
-    ext = Path(filename).suffix.lower()
-    return ext in allowed_extensions
+    # Extensão do último componente do caminho (mesmo resultado de Path.suffix,
+    # sem criar o objeto Path); nomes como ".xml" não têm extensão
+    name = filename.rstrip('/').rpartition('/')[2]
+    dot = name.rfind('.')
+    if dot <= 0 or dot == len(name) - 1:
+        return False
+    return name[dot:].lower() in allowed_extensions
 
 def validate_file_size(file_size: int, max_size_mb: int = None) -> bool:
     """
@@ -53,15 +67,18 @@ def validate_xml_content(xml_string: str) -> Tuple[bool, str]:
     """
     try:
         # Verifica se tem tag de abertura e fechamento
-        if not xml_string.strip().startswith('<?xml') and not xml_string.strip().startswith('<'):
+        if not xml_string.lstrip().startswith('<'):
             return False, "Arquivo não parece ser um XML válido"
         
-        # Tenta fazer parse básico
-        import xml.etree.ElementTree as ET
-        ET.fromstring(xml_string)
+        # Tenta fazer parse básico (lxml, em C); o target vazio só confere se o
+        # XML é bem formado, sem montar a árvore
+        parser = etree.XMLParser(resolve_entities=False, huge_tree=False,
+                                 target=_WellFormedTarget())
+        parser.feed(xml_string)
+        parser.close()
         return True, ""
     
-    except ET.ParseError as e:
+    except etree.XMLSyntaxError as e:
         return False, f"Erro de parse XML: {str(e)}"
     except Exception as e:
         return False, f"Erro ao validar XML: {str(e)}"
@@ -88,7 +105,8 @@ def validate_uploaded_files(uploaded_files) -> Tuple[bool, List[str]]:
             continue
         
         # Valida tamanho
-        if hasattr(file, 'size') and not validate_file_size(file.size):
+        size = getattr(file, 'size', None)
+        if size is not None and not validate_file_size(size):
             errors.append(f"❌ {file.name}: arquivo muito grande")
             continue
     